@@ -1,210 +1,156 @@
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.widgets import Button, Slider
-from matplotlib import animation
+from brainsim.fitzhugh_nagumo import Sim, Vnullcline, wnullcline, field
+from brainsim.render import BlitRenderer, RingBuffer
+from brainsim.producer import Producer
+from brainsim.phase_plane import PhasePlane
 
 """
-4.2.6 dns https://www.izhikevich.org/publications/
-Model:
-dV/dt = V*(a - V)*(V - 1) - w + I
-dw/dt = b*V - c*w
-V approximation of membrane potential
-w recovery variable slow outward currents
-I injected current
-a shape of the cubic parabola V(a − V)*(V − 1)
-b and c kinetics recovery variable
-Constraints:
-b > 0
-c ≥ 0
-
-for multiple recovery variables: 
-b c and w become vectors
-dV/dt = V*(a − V)*(V − 1) − sum(w) + I
-
-Nullclines:
-w = V*(a − V)*(V − 1) + I
-w = b/c * V
-
-Linearized stability w/ I=0:
-tr(L) = −a − c < 0 
-det(L) = ac + b > 0
+Interactive phase plane of the FitzHugh-Nagumo model, brainsim.fitzhugh_nagumo
 """
 
 
-# class that contains the sim neuron
-class Sim:
-    def __init__(self, a, b, c, I):
-        self.Vsim = 0
-        self.wsim = 0
-        self.a = a
-        self.b = b
-        self.c = c
-        self.I = I
-
-    def updatevar(self, a, b, c, I):
-        self.a = a
-        self.b = b
-        self.c = c
-        self.I = I
-
-    def step(self):
-        self.Vsim = self.Vsim + (self.Vsim * (self.a - self.Vsim) * (self.Vsim - 1) - self.wsim + self.I)
-        self.wsim = self.wsim + (self.b * self.Vsim - self.c * self.wsim)
-        return self.Vsim, self.wsim
-
-
-def frames():
-    while True:
-        yield s.step()
-
-
-def Vnullcline(V, a, I):
-    return V * (a - V) * (V - 1) + I
-
-
-def wnullcline(V, b, c):
-    return V * (b / c)
-
-
-def U_vec(X, Y, a, I):
-    return X * (np.full(X.shape, a) - X) * (X - np.ones(X.shape)) - Y + np.full(X.shape, I)
-
-
-def V_vec(X, Y, b, c):
-    return np.full(X.shape, b) * X - np.full(X.shape, c) * Y
-
-
-v = np.linspace(-0.6, 1.2, 1000)
-
-# Define initial parameters
-b = 0.01
-c = 0.02
-a = 0.1
-I = 0.0
-s = Sim(a, b, c, I)
-x1 = [0] * 100
-y1 = [0] * 100
-x2 = np.arange(-20 + 0.03, 0, 0.03)
-y2 = [0] * x2.size
-i = [-1.5] * x2.size
-x = np.arange(-0.6, 1.2, 0.1)
-y = np.arange(-0.05, 0.2, 0.01)
-X, Y = np.meshgrid(x, y)
-
-# Create the figure and the line that we will manipulate
-fig, ((ax1, ax2), axs) = plt.subplots(2, 2)
-gs = axs[1].get_gridspec()
-for ax in axs[:]:
-    ax.remove()
-ax3 = fig.add_subplot(gs[1, :])
-ax1.plot(v, Vnullcline(v, a, I), lw=2)
-ax1.plot(v, wnullcline(v, b, c), lw=2)
-ax1.set_xlabel('V')
-ax1.set_ylabel('w')
-U, V = U_vec(X, Y, a, I), V_vec(X, Y, b, c)
-ax1.quiver(X, Y, U, V)
-
-# setting limits to the axes
-ax1.set_xlim((-0.6, 1.2))
-ax1.set_ylim((-0.05, 0.2))
-ax2.set_ylim((-0.05, 0.25))
-ax2.set_xlim((-0.6, 1.2))
-ax3.set_ylim((-2, 2))
-# adjust the main plot to make room for the sliders
-fig.subplots_adjust(left=0.35, bottom=0.35)
-# Make a horizontal slider to control the current.
-axI = fig.add_axes([0.4, 0.1, 0.35, 0.03])
-I_slider = Slider(
-    ax=axI,
-    label='Current I [pA]',
-    valmin=0,
-    valmax=0.03,
-    valinit=I,
-)
-
-# Make a horizontal slider to control a.
-axa = fig.add_axes([0.4, 0.2, 0.35, 0.03])
-a_slider = Slider(
-    ax=axa,
-    label='a',
-    valmin=-1,
-    valmax=1,
-    valinit=I,
-)
-
-# Make a vertically oriented slider to control b
-axb = fig.add_axes([0.1, 0.25, 0.03, 0.5])
-b_slider = Slider(
-    ax=axb,
-    label="b",
-    valmin=-0.1,
-    valmax=0.1,
-    valinit=b,
-    orientation="vertical"
-)
-
-# Make a vertically oriented slider to control c
-axc = fig.add_axes([0.2, 0.25, 0.03, 0.5])
-c_slider = Slider(
-    ax=axc,
-    label="c",
-    valmin=0.0001,
-    valmax=0.3,
-    valinit=b,
-    orientation="vertical"
-)
-
-
-# The function to be called anytime a slider's value changes
-def update(val):
-    ax1.clear()
-    ax1.plot(v, Vnullcline(v, a_slider.val, I_slider.val), lw=2)
-    ax1.plot(v, wnullcline(v, b_slider.val, c_slider.val), lw=2)
-    U, V = U_vec(X, Y, a_slider.val, I_slider.val), V_vec(X, Y, b_slider.val, c_slider.val)
-    ax1.quiver(X, Y, U, V)
+def main():
+    v = np.linspace(-0.6, 1.2, 1000)
+
+    # Define initial parameters
+    b = 0.01
+    c = 0.02
+    a = 0.1
+    I = 0.0
+    s = Sim(a, b, c, I)
+    producer = Producer(s)  # steps s in the background, update() goes through producer.updatevar
+
+    x2 = np.arange(-20 + 0.03, 0, 0.03)
+    x1, y1 = RingBuffer(100), RingBuffer(100)  # phase plane trajectory
+    y2, i = RingBuffer(x2.size), RingBuffer(x2.size, fill=-1.5)  # V and I traces
+    x = np.arange(-0.6, 1.2, 0.1)
+    y = np.arange(-0.05, 0.2, 0.01)
+    X, Y = np.meshgrid(x, y)
+    scratch = np.empty(X.shape)  # for field(), no allocation per slider flush
+
+    # Create the figure and the line that we will manipulate
+    fig, ((ax1, ax2), axs) = plt.subplots(2, 2)
+    gs = axs[1].get_gridspec()
+    for ax in axs[:]:
+        ax.remove()
+    ax3 = fig.add_subplot(gs[1, :])
+    ax1.set_xlabel('V')
+    ax1.set_ylabel('w')
+
+    def compute(U, V):  # field and nullclines for the current slider values
+        field(X, Y, U, V, a_slider.val, b_slider.val, c_slider.val, I_slider.val, scratch)
+        return Vnullcline(v, a_slider.val, I_slider.val), wnullcline(v, b_slider.val, c_slider.val)
+
+    phase = PhasePlane(ax1, X, Y, v, compute, normalize=False)
+
+    # setting limits to the axes
     ax1.set_xlim((-0.6, 1.2))
     ax1.set_ylim((-0.05, 0.2))
-    fig.canvas.draw_idle()
-    ax2.set_ylim((-0.05, 0.25))
-    ax2.set_xlim((-0.6, 1.2))
-    s.updatevar(a_slider.val, b_slider.val, c_slider.val, I_slider.val)
-
-
-# register the update function with each slider
-a_slider.on_changed(update)
-b_slider.on_changed(update)
-c_slider.on_changed(update)
-I_slider.on_changed(update)
-
-# Create a `matplotlib.widgets.Button` to reset the sliders to initial values.
-resetax = fig.add_axes([0.8, 0.025, 0.1, 0.04])
-button = Button(resetax, 'Reset', hovercolor='0.975')
-
-
-def reset(event):
-    a_slider.reset()
-    b_slider.reset()
-    c_slider.reset()
-    I_slider.reset()
-
-
-def animate(args):
-    ax2.clear()
-    ax3.clear()
     ax2.set_ylim((-0.05, 0.25))
     ax2.set_xlim((-0.6, 1.2))
     ax3.set_ylim((-2, 2))
-    x1.pop(0)
-    y1.pop(0)
-    y2.pop(0)
-    i.pop(0)
-    x1.append(args[0])
-    y1.append(args[1])
-    y2.append(args[0])
-    i.append(I_slider.val*20-1.5)
-    return ax2.plot(x1, y1, color='g'), ax3.plot(x2, y2, color='b'),ax3.plot(x2, i, color='r'), plt.show()
-
-
-button.on_clicked(reset)
-anim = animation.FuncAnimation(fig, animate, frames=frames, interval=30, save_count=2000)
-plt.show()
+    ax3.set_xlim((x2[0], x2[-1]))
+    # adjust the main plot to make room for the sliders
+    fig.subplots_adjust(left=0.35, bottom=0.35)
+    # Make a horizontal slider to control the current.
+    axI = fig.add_axes([0.4, 0.1, 0.35, 0.03])
+    I_slider = Slider(
+        ax=axI,
+        label='Current I [pA]',
+        valmin=0,
+        valmax=0.03,
+        valinit=I,
+    )
+
+    # Make a horizontal slider to control a.
+    axa = fig.add_axes([0.4, 0.2, 0.35, 0.03])
+    a_slider = Slider(
+        ax=axa,
+        label='a',
+        valmin=-1,
+        valmax=1,
+        valinit=I,
+    )
+
+    # Make a vertically oriented slider to control b
+    axb = fig.add_axes([0.1, 0.25, 0.03, 0.5])
+    b_slider = Slider(
+        ax=axb,
+        label="b",
+        valmin=-0.1,
+        valmax=0.1,
+        valinit=b,
+        orientation="vertical"
+    )
+
+    # Make a vertically oriented slider to control c
+    axc = fig.add_axes([0.2, 0.25, 0.03, 0.5])
+    c_slider = Slider(
+        ax=axc,
+        label="c",
+        valmin=0.0001,
+        valmax=0.3,
+        valinit=b,
+        orientation="vertical"
+    )
+
+    # The function to be called anytime a slider's value changes
+    def update(val):
+        phase.request()
+        producer.updatevar(a_slider.val, b_slider.val, c_slider.val, I_slider.val)
+
+    # register the update function with each slider
+    a_slider.on_changed(update)
+    b_slider.on_changed(update)
+    c_slider.on_changed(update)
+    I_slider.on_changed(update)
+    phase.flush()
+
+    # Create a `matplotlib.widgets.Button` to reset the sliders to initial values.
+    resetax = fig.add_axes([0.8, 0.025, 0.1, 0.04])
+    button = Button(resetax, 'Reset', hovercolor='0.975')
+
+    def reset(event):
+        a_slider.reset()
+        b_slider.reset()
+        c_slider.reset()
+        I_slider.reset()
+
+    def produce():
+        V, u = producer.drain()
+        x1.push(V)
+        y1.push(u)
+        y2.push(V)
+        i.push(np.full(V.size, I_slider.val * 20 - 1.5))
+
+    button.on_clicked(reset)
+
+    # Make a horizontal slider to control the simulation speed, 10^speed times one step per 30 ms.
+    axspeed = fig.add_axes([0.4, 0.03, 0.3, 0.03])
+    speed_slider = Slider(
+        ax=axspeed,
+        label='speed',
+        valmin=0,
+        valmax=4,
+        valinit=0,
+    )
+
+    def set_speed(val):
+        producer.speed = 10 ** val
+
+    speed_slider.on_changed(set_speed)
+
+    renderer = BlitRenderer(fig)
+    renderer.add_line(ax2, x1, y1, color='g')
+    renderer.add_line(ax3, x2, y2, color='b')
+    renderer.add_line(ax3, x2, i, color='r')
+    fig.canvas.mpl_connect('close_event', lambda event: producer.stop())
+    producer.start()
+    renderer.start(produce)
+    plt.show()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import importlib
+
+"""
+Simulation core: neuron models, populations, the genome and the white matter brain
+
+Names are imported from their module on first use, so `import brainsim` costs next to nothing and a batch job only
+pays for the modules it touches. None of the modules import matplotlib, networkx or torch at import time, plotting
+and the interactive phase planes (izhikevich.py, ... at the repository root) import them where they are used.
+brainsim.render draws on a figure it is given and leaves the import of matplotlib to its caller. brainsim.kernels
+(Numba, optional) and brainsim.torch_backend (torch) are only imported for backend="numba" / backend="torch".
+"""
+
+_exports = {
+    "IzhikevichPopulation": "populations",
+    "Izhikevich2003Population": "populations",
+    "Projection": "synapses",
+    "compile_projections": "synapses",
+    "Topology": "topology",
+    "Layer": "grey_white_matter",
+    "GreyMatter": "grey_white_matter",
+    "WhiteMatter": "grey_white_matter",
+    "scale_brain": "grey_white_matter",
+    "ParallelWhiteMatter": "parallel",
+    "partition_chunks": "partition",
+    "save_genome": "genome_io",
+    "load_genome": "genome_io",
+    "load_tables": "genome_io",
+    "Genome": "evolve",
+    "Evolution": "evolve",
+    "canonical_hash": "fitness_cache",
+    "FitnessCache": "fitness_cache",
+    "run_regimes": "regimes",
+    "fixed_points": "analysis",
+    "bifurcation": "analysis",
+    "Neurons": "integrators",
+    "SpikeRecorder": "spike_recorder",
+    "SpikeReader": "spike_recorder",
+    "Probe": "probes",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module("." + _exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
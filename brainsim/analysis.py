@@ -0,0 +1,166 @@
+import time
+import numpy as np
+
+"""
+Equilibria, linear stability and bifurcations of the explorer models over parameter grids
+
+The fixed points are the intersections of the nullclines of each model (see the docstrings of the model modules),
+solved in closed form:
+
+izhikevich         u = b*(V - Vr),  k*V^2 - (k*(Vr + Vt) + b)*V + k*Vr*Vt + b*Vr + I = 0
+izhikevich_simple  u = b*V,         V^2 - b*V + I = 0
+izhikevich2003     u = b*V,         0.04*V^2 + (5 - b)*V + 140 + I = 0
+fitzhugh_nagumo    w = b/c*V,       V^3 - (1 + a)*V^2 + (a + b/c)*V - I = 0  (c = 0: V = 0, w = I)
+
+With the Jacobian L at a fixed point, tr(L) and det(L) classify it:
+det < 0 saddle, det > 0 and tr < 0 stable (node if tr^2 >= 4*det, else focus), tr > 0 unstable, tr = 0 center.
+
+All parameters are broadcast against each other, so a 1000 x 1000 grid of (I, b) is one call. Roots are returned
+along a trailing axis (2 for the quadratic models, 3 for FitzHugh-Nagumo) in ascending order of V, NaN where the
+fixed point does not exist, kind is then 0. bifurcation() locates saddle-node (number of fixed points changes) and
+Hopf (a focus changes stability) points along the I axis of such a grid.
+"""
+
+kinds = ["none", "stable node", "stable focus", "unstable node", "unstable focus", "saddle", "center"]
+
+defaults = {  # the initial slider values of the explorers
+    "izhikevich": dict(Vr=-60.0, Vt=-40.0, k=0.7, C=100.0, a=0.03, b=-2.0, I=0.0),
+    "izhikevich_simple": dict(a=0.03, b=-0.02, I=0.0),
+    "izhikevich2003": dict(a=0.02, b=0.2, I=14.0),
+    "fitzhugh_nagumo": dict(a=0.1, b=0.01, c=0.02, I=0.0),
+}
+
+
+def _quadratic_roots(A, B, C):  # real roots of A*x^2 + B*x + C, shape (..., 2), NaN where there are none
+    disc = B * B - 4 * A * C
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sq = np.sqrt(disc)
+        # the form without cancellation: q = -(B + sign(B)*sq)/2, roots q/A and C/q
+        q = -0.5 * (B + np.copysign(sq, B))
+        r1 = q / A
+        r2 = np.where(q != 0, C / q, r1)
+    r = np.stack(np.broadcast_arrays(np.minimum(r1, r2), np.maximum(r1, r2)), axis=-1)
+    r[disc < 0] = np.nan
+    return r
+
+
+def _cubic_roots(p2, p1, p0):  # real roots of x^3 + p2*x^2 + p1*x + p0, shape (..., 3), NaN padded
+    p2, p1, p0 = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (p2, p1, p0)))
+    shift = p2 / 3
+    p = p1 - p2 * shift
+    q = 2 * shift ** 3 - shift * p1 + p0
+    three = 4 * p ** 3 + 27 * q * q < 0  # three distinct real roots, p < 0
+    r = np.full(p.shape + (3,), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        m = 2 * np.sqrt(-p[three] / 3)
+        theta = np.arccos(np.clip(3 * q[three] / (p[three] * m), -1, 1)) / 3
+        for j in range(3):
+            r[three, j] = m * np.cos(theta - 2 * np.pi * j / 3)
+        one = ~three
+        sq = np.sqrt(q[one] ** 2 / 4 + p[one] ** 3 / 27)
+        r[one, 0] = np.cbrt(-q[one] / 2 + sq) + np.cbrt(-q[one] / 2 - sq)
+    r -= shift[..., None]
+    return np.sort(r, axis=-1)  # NaN sort last
+
+
+def _izhikevich(Vr, Vt, k, C, a, b, I):
+    V = _quadratic_roots(k, -(k * (Vr + Vt) + b), k * Vr * Vt + b * Vr + I)
+    Vr, Vt, k, C, a, b = (np.asarray(x)[..., None] for x in (Vr, Vt, k, C, a, b))
+    return V, b * (V - Vr), k * (2 * V - Vr - Vt) / C, -1 / C, a * b, -a
+
+
+def _izhikevich_simple(a, b, I):
+    V = _quadratic_roots(1.0, -np.asarray(b, dtype=np.float64), I)
+    a, b = (np.asarray(x)[..., None] for x in (a, b))
+    return V, b * V, 2 * V, -1.0, a * b, -a
+
+
+def _izhikevich2003(a, b, I):
+    V = _quadratic_roots(0.04, 5 - np.asarray(b, dtype=np.float64), 140 + np.asarray(I, dtype=np.float64))
+    a, b = (np.asarray(x)[..., None] for x in (a, b))
+    return V, b * V, 0.08 * V + 5, -1.0, a * b, -a
+
+
+def _fitzhugh_nagumo(a, b, c, I):
+    a, b, c, I = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (a, b, c, I)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        V = _cubic_roots(-(1 + a), a + b / c, -I)
+        w = (b / c)[..., None] * V
+    zero = c == 0  # w nullcline V = 0: the single fixed point (0, I)
+    V[zero] = [0.0, np.nan, np.nan]
+    w[zero] = np.stack([I[zero], np.full(I[zero].shape, np.nan), np.full(I[zero].shape, np.nan)], axis=-1)
+    a, b, c = (x[..., None] for x in (a, b, c))
+    return V, w, -3 * V * V + 2 * (1 + a) * V - a, -1.0, b, -c
+
+
+_models = {"izhikevich": _izhikevich, "izhikevich_simple": _izhikevich_simple,
+           "izhikevich2003": _izhikevich2003, "fitzhugh_nagumo": _fitzhugh_nagumo}
+
+
+def classify(tr, det):  # index into kinds, 0 where tr or det is NaN
+    kind = np.zeros(np.broadcast(tr, det).shape, dtype=np.int8)
+    stable, unstable = tr < 0, tr > 0
+    node = tr * tr >= 4 * det
+    positive = det > 0
+    kind[positive & stable & node] = 1
+    kind[positive & stable & ~node] = 2
+    kind[positive & unstable & node] = 3
+    kind[positive & unstable & ~node] = 4
+    kind[det < 0] = 5
+    kind[positive & (tr == 0)] = 6
+    return kind
+
+
+def fixed_points(model, **params):  # dict of V, u, tr, det, kind, all of shape broadcast(params) + (roots,)
+    if model not in _models:
+        raise ValueError(f"unknown model {model!r}, one of {sorted(_models)}")
+    p = dict(defaults[model])
+    unknown = set(params) - set(p)
+    if unknown:
+        raise ValueError(f"{model} has no parameter {sorted(unknown)}")
+    p.update(params)
+    V, u, j11, j12, j21, j22 = _models[model](**p)
+    tr = j11 + j22
+    det = j11 * j22 - j12 * j21
+    tr, det = np.broadcast_arrays(tr, det)
+    return {"V": V, "u": u, "tr": tr, "det": det, "kind": classify(tr, det)}
+
+
+def bifurcation(model, I, axis=-1, **params):
+    # fixed points over the I grid (broadcast with params) and the bifurcations between neighbouring I values:
+    # saddle_node / hopf are boolean of the grid shape minus one along axis, True between I[i] and I[i + 1]
+    fp = fixed_points(model, I=I, **params)
+    axis = axis % (fp['kind'].ndim - 1)
+    count = np.isfinite(fp['V']).sum(axis=-1)
+    fp['saddle_node'] = np.diff(count, axis=axis) != 0
+    # a focus that changes stability: some root keeps det > 0 and flips the sign of tr
+    kind = np.moveaxis(fp['kind'], axis, 0)
+    tr = np.moveaxis(fp['tr'], axis, 0)
+    focus = ((kind[:-1] == 2) | (kind[:-1] == 4) | (kind[:-1] == 6)) & \
+            ((kind[1:] == 2) | (kind[1:] == 4) | (kind[1:] == 6))
+    flips = focus & (np.sign(tr[:-1]) != np.sign(tr[1:]))
+    fp['hopf'] = np.moveaxis(flips.any(axis=-1), 0, axis)
+    return fp
+
+
+def benchmark(points=10 ** 6):  # seconds for fixed_points of every model on a sqrt(points)^2 (I, b) grid
+    n = int(round(points ** 0.5))
+    results = {}
+    for model, p in defaults.items():
+        I = np.linspace(-2 * abs(p['I']) - 1, 2 * abs(p['I']) + 1, n)[:, None]
+        b = p['b'] * np.linspace(0.5, 1.5, n)[None, :]
+        start = time.perf_counter()
+        bifurcation(model, I, axis=0, b=b)
+        results[model] = time.perf_counter() - start
+    return results
+
+
+if __name__ == "__main__":
+    for model, seconds in benchmark().items():
+        print(f"{model:>18}: 10^6 parameter points in {seconds:.3f} s")
+    fp = bifurcation("izhikevich2003", np.linspace(-20, 20, 4001))
+    I = np.linspace(-20, 20, 4001)
+    print("izhikevich2003 saddle-node near I =", I[1:][fp['saddle_node']],
+          " closed form", (5 - 0.2) ** 2 / 0.16 - 140)
+    fp = bifurcation("fitzhugh_nagumo", np.linspace(0, 0.3, 3001))
+    print("fitzhugh_nagumo Hopf near I =", np.linspace(0, 0.3, 3001)[1:][fp['hopf']])
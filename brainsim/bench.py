@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import argparse
+import numpy as np
+
+"""
+Benchmark suite: explorer Sims, populations, the white matter brain and genome I/O
+
+Every case is a setup function returning the callable to time. measure() calls it once and records that first call
+separately (first_call: JIT compilation, torch.compile, caches), calls it warmup more times, calibrates how many calls
+make one sample of at least min_time seconds and takes repeat samples. The seconds per call of the samples are
+summarised as median, percentiles, min, max and mean; only these enter the comparison, never the first call.
+
+python -m brainsim.bench [--quick] [--filter population] [--backends numpy numba] [--out bench.json]
+                         [--baseline baseline.json] [--threshold 0.1]
+
+writes the results with the machine and library versions as JSON. With --baseline every case present in both is
+compared: a median more than threshold above the baseline median is a regression, the exit status is then 1.
+"""
+
+percentiles = (5, 25, 50, 75, 95)
+
+
+def measure(fn, repeat=15, warmup=2, min_time=0.02):  # statistics of the seconds per call of fn()
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+    for _ in range(warmup):
+        fn()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 10 ** 6:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    samples = np.array(samples)
+    stats = {f"p{p}": float(v) for p, v in zip(percentiles, np.percentile(samples, percentiles))}
+    stats.update(median=float(np.median(samples)), min=float(samples.min()), max=float(samples.max()),
+                 mean=float(samples.mean()), first_call=first, number=number, repeat=repeat)
+    return stats
+
+
+def _sim_cases():
+    from . import izhikevich, izhikevich_simple, izhikevich2003, fitzhugh_nagumo
+    return {  # the initial slider values of the explorers
+        "izhikevich": lambda: izhikevich.Sim(-60, -40, 35, 0.03, -2, -50, 100, 0.7, 70, 100).step,
+        "izhikevich_simple": lambda: izhikevich_simple.Sim(0.03, -0.02, -0.5, 1, 0.1).step,
+        "izhikevich2003": lambda: izhikevich2003.Sim(30, 0.02, 0.2, -65, 6, 14).step,
+        "fitzhugh_nagumo": lambda: fitzhugh_nagumo.Sim(0.1, 0.01, 0.02, 0.1).step,
+    }
+
+
+def _population(n, backend):
+    def setup():
+        from .populations import IzhikevichPopulation
+        return IzhikevichPopulation(n, -60, -40, 35, 0.03, -2, -50, 100, 0.7, 70, 100, backend=backend).step
+    return setup
+
+
+def _brain(data, backend):
+    def setup():
+        from .grey_white_matter import WhiteMatter
+        return WhiteMatter(data(), seed=0, backend=backend).step_all
+    return setup
+
+
+def _sample():
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "brain-data.json")) as bf:
+        return json.load(bf)
+
+
+def _scaled(**kwargs):
+    def data():
+        from .grey_white_matter import scale_brain
+        return scale_brain(_sample(), **kwargs)
+    return data
+
+
+def _genome(op, data, tmpdir):
+    def setup():
+        from .genome_io import save_genome, load_genome
+        brain_data = data()
+        path = os.path.join(tmpdir, "bench_genome." + ("json" if op.endswith("json") else "npz"))
+        if op.endswith("json"):
+            save = lambda: _dump_json(brain_data, path)
+            load = lambda: _load_json(path)
+        else:
+            save = lambda: save_genome(brain_data, path)
+            load = lambda: load_genome(path)
+        save()
+        return save if op.startswith("save") else load
+    return setup
+
+
+def _dump_json(brain_data, path):
+    with open(path, "w") as f:
+        json.dump(brain_data, f)
+
+
+def _load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _torch_cos_sin():  # the case of trying_pytorch.py on the CPU, compile time goes to first_call
+    import torch
+    fn = torch.compile(lambda x, y: torch.cos(x) + torch.sin(y))
+    x = torch.randn(2 ** 20)
+    return lambda: fn(x, x)
+
+
+def cases(quick=False, backends=("numpy",), tmpdir="."):  # {name: setup}, genome files are written to tmpdir
+    found = {f"sim/{model}": setup for model, setup in _sim_cases().items()}
+    sizes = (10 ** 3, 10 ** 5) if quick else (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+    brains = [("sample", _sample), ("copies=10", _scaled(copies=10)), ("size=10", _scaled(size_factor=10))]
+    if not quick:
+        brains += [("copies=100", _scaled(copies=100)), ("size=100", _scaled(size_factor=100))]
+    for backend in backends:
+        for n in sizes:
+            found[f"population/{backend}/n={n}"] = _population(n, backend)
+        for label, data in brains:
+            found[f"white_matter/{backend}/{label}"] = _brain(data, backend)
+    genome = _scaled(copies=10 if quick else 100)
+    for op in ("save_json", "load_json", "save_npz", "load_npz"):
+        found[f"genome/{op}"] = _genome(op, genome, tmpdir)
+    if "torch" in backends:
+        found["torch/cos+sin n=2^20"] = _torch_cos_sin
+    return found
+
+
+def _versions():
+    versions = {"python": platform.python_version(), "numpy": np.__version__}
+    for name in ("numba", "torch"):
+        module = sys.modules.get(name)
+        if module is not None:
+            versions[name] = module.__version__
+    return versions
+
+
+def run(quick=False, backends=("numpy",), filter=None, log=None, **kwargs):  # kwargs go to measure()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:  # the genome files
+        for name, setup in cases(quick, backends, tmpdir).items():
+            if filter and filter not in name:
+                continue
+            results[name] = measure(setup(), **kwargs)
+            if log:
+                log(name, results[name])
+    return {"machine": {"platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count(),
+                        "time": time.strftime("%Y-%m-%dT%H:%M:%S"), **_versions()},
+            "results": results}
+
+
+def compare(results, baseline, threshold=0.1):
+    # {name: median / baseline median} of the cases in both, and the names that regressed by more than threshold
+    ratios = {name: stats["median"] / baseline["results"][name]["median"]
+              for name, stats in results["results"].items() if name in baseline["results"]}
+    return ratios, [name for name, ratio in ratios.items() if ratio > 1 + threshold]
+
+
+def _print(name, stats):
+    print(f"{name:<36} median {stats['median'] * 1e6:12.2f} us  p5 {stats['p5'] * 1e6:12.2f}  "
+          f"p95 {stats['p95'] * 1e6:12.2f}  first call {stats['first_call'] * 1e3:9.2f} ms", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m brainsim.bench", description="brainsim benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, for a check before a commit")
+    parser.add_argument("--filter", help="only the cases whose name contains this")
+    parser.add_argument("--backends", nargs="+", default=["numpy"], choices=["numpy", "numba", "torch"])
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown of the median, 0.1 = 10%%")
+    args = parser.parse_args(argv)
+    results = run(args.quick, args.backends, args.filter, repeat=args.repeat, log=_print)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        ratios, regressions = compare(results, baseline, args.threshold)
+        for name, ratio in ratios.items():
+            flag = "  REGRESSION" if name in regressions else ""
+            print(f"{name:<36} {ratio:6.2f}x baseline{flag}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
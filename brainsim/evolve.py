@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import pickle
+import random
+from concurrent.futures import ProcessPoolExecutor
+import numpy
+from .genome_io import save_genome, load_genome, dumps_genome, loads_genome
+from .fitness_cache import canonical_hash
+
+"""
+Genome editing and the evolutionary loop
+
+A population of Genomes evolves by tournament selection, uniform chunk crossover and random mutations built on
+createnewchunk/addlayer2chunk/add_input2chunk. Fitness evaluation is fanned out over a process pool, genomes travel
+to the workers as the flat tables of genome_io.dumps_genome. A fitness function takes (brain_data, seed) and returns
+a float, higher is better; it has to be a module level function so the pool can pickle it.
+With a fitness_cache.FitnessCache, genomes with the same canonical_hash are scored once; the evaluation seed is then
+fixed (eval_seed) so that a cached score means the same thing in every generation.
+"""
+
+
+def addlayer2chunk(chunk, size, inputlayers: list = [int],  #adds layers to existing chunks
+                   a: list = [int],b: list = [int], c: int = 0,d: list = [int],  # a,b,c,d par of Izhikevich model
+                   ei: list = [bool]):  # ei => Excitatory /inhibitory
+    if d is None:
+        d = [0]
+    if len(ei) != len(inputlayers):
+        return 1
+    layer = {"layer": chunk["layers"][-1]["layer"] + 1 if chunk["layers"] else 0,  # ids may start at 0 or 1
+             "size": size,
+             "dynamics": {"a": a, "b": b, "c": c, "d": d},
+             "input_layers": inputlayers,
+             "exci_inhi": ei
+             }
+    chunk["layers"].append(layer)
+    return chunk
+
+
+def addlayers2chunk(chunk, layers):  # layers: (size, inputlayers, a, b, c, d, ei) tuples, all or nothing
+    if any(len(layer[6]) != len(layer[1]) for layer in layers):
+        return 1
+    for layer in layers:
+        addlayer2chunk(chunk, *layer)
+    return chunk
+
+
+class Genome:  # mutate through the methods below, they keep the per chunk input index up to date
+    def __init__(self, file_name=None, chunks=None):  # JSON genome, the binary format of genome_io for .npz files,
+        # or an already loaded {"chunks": [...]} dict
+        self.file_name = file_name
+        if chunks is not None:
+            self.chunks = chunks
+        elif file_name.endswith('.npz'):
+            self.chunks = load_genome(file_name)
+        else:
+            with open(self.file_name) as f:
+                self.chunks = json.load(f)
+        self.input_index = {}  # chunk position -> {(from_node, from_layer): local_layer_assigned_id}, built on use
+        self.next_local_id = {}  # chunk position -> next free (negative) local_layer_assigned_id
+
+    def createnewchunk(self, fromnode, fromlayer, name=""):
+        if len(fromnode) != len(fromlayer):
+            return 1
+        chunk = {'id': len(self.chunks["chunks"]), 'name': name, "input": {
+            "from_node": fromnode, "from_layer": fromlayer,
+            "local_layer_assigned_id": [*range(-len(fromlayer), 0, 1)]}, "layers": []}
+        return chunk
+
+    def createnewchunks(self, fromnodes, fromlayers, names=None):  # consecutive ids, for addchunks2brain
+        if names is None:
+            names = [""] * len(fromnodes)
+        if len(fromnodes) != len(fromlayers) or any(len(fn) != len(fl) for fn, fl in zip(fromnodes, fromlayers)):
+            return 1
+        first = len(self.chunks["chunks"])
+        return [{'id': first + i, 'name': name, "input": {
+            "from_node": fn, "from_layer": fl,
+            "local_layer_assigned_id": [*range(-len(fl), 0, 1)]}, "layers": []}
+            for i, (fn, fl, name) in enumerate(zip(fromnodes, fromlayers, names))]
+
+    def addchunk2brain(self, chunk):
+        self.chunks["chunks"].append(chunk)
+
+    def addchunks2brain(self, chunks):
+        self.chunks["chunks"].extend(chunks)
+
+    def addlayers2chunks(self, nodes, layers):  # adds layers[i] (see addlayers2chunk) to the chunk at nodes[i]
+        if len(nodes) != len(layers) or any(len(layer[6]) != len(layer[1]) for layer in layers):
+            return 1
+        chunks = self.chunks["chunks"]
+        for node, layer in zip(nodes, layers):
+            addlayer2chunk(chunks[node], *layer)
+
+    def _input_index(self, node):
+        index = self.input_index.get(node)
+        if index is None:
+            inp = self.chunks["chunks"][node]["input"]
+            index = dict(zip(zip(inp["from_node"], inp["from_layer"]), inp["local_layer_assigned_id"]))
+            self.input_index[node] = index
+            self.next_local_id[node] = min(inp["local_layer_assigned_id"], default=0) - 1
+        return index
+
+    def _add_input(self, node, fromchunk, fromlayer, tolayer, ei):
+        index = self._input_index(node)
+        chunk = self.chunks["chunks"][node]
+        pointer_lla_id = index.get((fromchunk, fromlayer))
+        if pointer_lla_id is None:
+            pointer_lla_id = self.next_local_id[node]
+            self.next_local_id[node] -= 1
+            index[(fromchunk, fromlayer)] = pointer_lla_id
+            chunk["input"]["from_node"].append(fromchunk)
+            chunk["input"]["from_layer"].append(fromlayer)
+            chunk["input"]["local_layer_assigned_id"].append(pointer_lla_id)
+        layer = chunk["layers"][tolayer]
+        layer["input_layers"].append(pointer_lla_id)
+        if ei is not None:
+            layer["exci_inhi"].append(ei)
+
+    def add_input2chunk(self, node, fromchunk, fromlayer, tolayer, ei=None):  # add connections to existing nodes
+        # inputs from an already known (fromchunk, fromlayer) reuse its local id, ei optionally extends exci_inhi
+        for i, (fc, fl, tl) in enumerate(zip(fromchunk, fromlayer, tolayer)):
+            self._add_input(node, fc, fl, tl, None if ei is None else ei[i])
+
+    def add_inputs2chunks(self, nodes, fromchunks, fromlayers, tolayers, ei=None):  # one input per entry, any chunks
+        for i, (node, fc, fl, tl) in enumerate(zip(nodes, fromchunks, fromlayers, tolayers)):
+            self._add_input(node, fc, fl, tl, None if ei is None else ei[i])
+
+    def savetofile(self, new_file):
+        # Writing to file
+        with open(new_file, "w") as outfile:
+            json.dump(self.chunks, outfile)
+
+    def savebinary(self, new_file):  # typed array tables, see genome_io
+        save_genome(self.chunks, new_file)
+
+    def copy(self):
+        return Genome(self.file_name, pickle.loads(pickle.dumps(self.chunks)))  # much faster than deepcopy
+
+    def canonical_hash(self):  # equal for genomes that only differ in local id numbering or list order
+        return canonical_hash(self.chunks)
+
+
+def benchmark_mutations(genome, n=100000, seed=0):  # mutations/second, one call per mutation and batched
+    rng = random.Random(seed)
+    n_chunks = len(genome.chunks["chunks"])
+    layer_spec = (64, [-1, 0], [0.02, 0.015], [0.2, 0.15], -55, [4.1, 3.2], [True, False])
+    n_layers, n_new = n // 10, n // 10
+    n_inputs = n - n_layers - n_new
+    nodes = [rng.randrange(n_chunks) for _ in range(n_inputs)]
+    fromchunks = [rng.randrange(n_chunks) for _ in range(n_inputs)]
+    fromlayers = [rng.choice((1, 2)) for _ in range(n_inputs)]
+    tolayers = [rng.randrange(len(genome.chunks["chunks"][node]["layers"])) for node in nodes]
+    ei = [rng.random() < 0.8 for _ in range(n_inputs)]
+    layer_nodes = [rng.randrange(n_chunks) for _ in range(n_layers)]
+    new_from = [[rng.randrange(n_chunks)] for _ in range(n_new)]
+    results = {}
+    start = time.perf_counter()
+    for i in range(n_inputs):
+        genome.add_input2chunk(nodes[i], [fromchunks[i]], [fromlayers[i]], [tolayers[i]], [ei[i]])
+    for node in layer_nodes:
+        addlayer2chunk(genome.chunks["chunks"][node], *layer_spec)
+    for fn in new_from:
+        genome.addchunk2brain(genome.createnewchunk(fn, [1]))
+    results['single'] = n / (time.perf_counter() - start)
+    start = time.perf_counter()
+    genome.add_inputs2chunks(nodes, fromchunks, fromlayers, tolayers, ei)
+    genome.addlayers2chunks(layer_nodes, [layer_spec] * n_layers)
+    genome.addchunks2brain(genome.createnewchunks(new_from, [[1]] * n_new))
+    results['batch'] = n / (time.perf_counter() - start)
+    return results
+
+
+def _random_layer(rng, chunk, n_inputs):  # addlayer2chunk arguments around the regular spiking parameters
+    local_ids = [layer["layer"] for layer in chunk["layers"]] + chunk["input"]["local_layer_assigned_id"]
+    inputs = [rng.choice(local_ids) for _ in range(min(n_inputs, len(local_ids)))]
+    m = rng.randint(1, 2)
+    return (rng.choice((32, 64, 128)), inputs,
+            [round(rng.uniform(0.01, 0.1), 4) for _ in range(m)], [round(rng.uniform(0.15, 0.25), 4) for _ in range(m)],
+            rng.randint(-65, -50), [round(rng.uniform(0.5, 8), 3) for _ in range(m)],
+            [rng.random() < 0.8 for _ in inputs])
+
+
+def mutate(genome, rng, n=1):  # n random structural or parametric mutations, in place
+    chunks = genome.chunks["chunks"]
+    for _ in range(n):
+        kind = rng.random()
+        node = rng.randrange(len(chunks))
+        chunk = chunks[node]
+        if kind < 0.4 and chunk["layers"]:  # new input from a layer of another chunk
+            source = chunks[rng.randrange(len(chunks))]
+            if source["layers"]:
+                genome.add_input2chunk(node, [source["id"]], [rng.choice(source["layers"])["layer"]],
+                                       [rng.randrange(len(chunk["layers"]))], [rng.random() < 0.8])
+        elif kind < 0.7 and chunk["layers"]:  # jitter the dynamics of one layer
+            dyn = rng.choice(chunk["layers"])["dynamics"]
+            key = rng.choice("abd")
+            j = rng.randrange(len(dyn[key]))
+            dyn[key][j] = round(dyn[key][j] * rng.uniform(0.8, 1.25), 4)
+        elif kind < 0.85:  # new layer
+            addlayer2chunk(chunk, *_random_layer(rng, chunk, rng.randint(1, 3)))
+        else:  # new chunk fed by one layer of an existing chunk
+            source = chunks[node]
+            if source["layers"]:
+                new = genome.createnewchunk([source["id"]], [rng.choice(source["layers"])["layer"]],
+                                            f"chunk_{len(chunks)}")
+                addlayer2chunk(new, *_random_layer(rng, new, 2))
+                genome.addchunk2brain(new)
+    return genome
+
+
+def crossover(a, b, rng):  # uniform per chunk position, the tail of the longer parent is kept
+    # inputs naming a layer the other parent's chunk lacks are skipped by synapses.resolve_inputs
+    child = a.copy()
+    chunks_b = b.chunks["chunks"]
+    for i, chunk in enumerate(child.chunks["chunks"]):
+        if i < len(chunks_b) and rng.random() < 0.5:
+            child.chunks["chunks"][i] = pickle.loads(pickle.dumps(chunks_b[i]))
+    return child
+
+
+def activity_fitness(brain_data, seed=0, steps=400, target_rate=10.0):  # mean firing rate close to target_rate Hz
+    from .grey_white_matter import WhiteMatter
+    brain = WhiteMatter(brain_data, seed=seed)
+    spikes = 0
+    for _ in range(steps):
+        brain.step_all()
+        spikes += sum(region.spiking.size for region in brain.grey_matter)
+    neurons = sum(region.size for region in brain.grey_matter)
+    if neurons == 0:
+        return -float("inf")
+    rate = spikes / neurons / (steps * brain.grey_matter[0].dt / 1000)
+    return -abs(rate - target_rate)
+
+
+def _evaluate(args):  # runs in the pool
+    data, fitness, seed = args
+    return fitness(loads_genome(data), seed)
+
+
+class Evolution:
+    def __init__(self, genome, population=32, elite=2, mutations=3, crossover_rate=0.3, tournament=3,
+                 fitness=activity_fitness, workers=None, seed=None, cache=None, eval_seed=None):
+        self.rng = random.Random(seed)
+        self.population = [genome] + [mutate(genome.copy(), self.rng, mutations) for _ in range(population - 1)]
+        self.elite = elite
+        self.mutations = mutations
+        self.crossover_rate = crossover_rate
+        self.tournament = tournament
+        self.fitness = fitness
+        self.cache = cache
+        self.eval_seed = 0 if eval_seed is None and cache is not None else eval_seed
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(self.workers)
+        self.generation = 0
+        self.history = []  # (generation, best, mean, seconds)
+
+    def evaluate(self, population):
+        if self.eval_seed is None:
+            seed = self.rng.randrange(2 ** 32)  # same seed for the whole generation, so scores are comparable
+        else:
+            seed = self.eval_seed
+        if self.cache is None:
+            return self._evaluate_all([genome.chunks for genome in population], seed)
+        context = f"{self.fitness.__module__}.{self.fitness.__qualname__}:{seed}:"
+        keys = [context + genome.canonical_hash() for genome in population]
+        scores = self.cache.get_many(keys)
+        todo = {}  # one evaluation per distinct missing genome
+        for key, genome in zip(keys, population):
+            if key not in scores:
+                todo.setdefault(key, genome.chunks)
+        if todo:
+            new = dict(zip(todo, self._evaluate_all(list(todo.values()), seed)))
+            self.cache.put_many(new)
+            scores.update(new)
+        return [scores[key] for key in keys]
+
+    def _evaluate_all(self, genomes, seed):
+        jobs = [(dumps_genome(chunks), self.fitness, seed) for chunks in genomes]
+        chunksize = max(1, len(jobs) // (4 * self.workers))
+        return list(self.pool.map(_evaluate, jobs, chunksize=chunksize))
+
+    def _select(self, ranked):
+        return max(self.rng.sample(ranked, min(self.tournament, len(ranked))), key=lambda x: x[0])[1]
+
+    def step(self):
+        start = time.perf_counter()
+        scores = self.evaluate(self.population)
+        ranked = sorted(zip(scores, self.population), key=lambda x: x[0], reverse=True)
+        children = [genome for _, genome in ranked[:self.elite]]
+        while len(children) < len(self.population):
+            parent = self._select(ranked)
+            if self.rng.random() < self.crossover_rate:
+                child = crossover(parent, self._select(ranked), self.rng)
+            else:
+                child = parent.copy()
+            children.append(mutate(child, self.rng, self.mutations))
+        self.population = children
+        self.generation += 1
+        self.best = ranked[0][1]
+        self.history.append((self.generation, ranked[0][0], float(numpy.mean(scores)), time.perf_counter() - start))
+        return self.history[-1]
+
+    def run(self, generations):
+        for _ in range(generations):
+            self.step()
+        return self.history
+
+    def generations_per_hour(self):
+        seconds = sum(h[3] for h in self.history)
+        return 3600 * len(self.history) / seconds if seconds else 0.0
+
+    def close(self):
+        self.pool.shutdown()
+
+
+if __name__ == "__main__":
+    from .fitness_cache import FitnessCache
+    cache = FitnessCache("fitness_cache.sqlite")
+    evolution = Evolution(Genome("brain-data.json"), population=16, seed=0, cache=cache)
+    for generation, best, mean, seconds in evolution.run(10):
+        print(f"generation {generation:>3}  best {best:8.3f}  mean {mean:8.3f}  {seconds:6.2f}s")
+    print(f"{evolution.generations_per_hour():.0f} generations/hour with {evolution.workers} workers, "
+          f"fitness cache hit rate {cache.hit_rate:.1%}")
+    cache.close()
+    evolution.best.savetofile("brain2.json")
+    evolution.close()
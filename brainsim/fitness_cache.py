@@ -0,0 +1,101 @@
+import json
+import sqlite3
+import hashlib
+
+"""
+Content-addressed fitness cache
+
+canonical_hash gives the same digest to genomes that only differ by ordering noise:
+- input_layers entries are rewritten to what they point at, ("in", from_node, from_layer) for negative ids and
+  ("local", layer id) otherwise, so the local_layer_assigned_id numbering disappears
+- the (input, exci_inhi) pairs of a layer and the input table of a chunk are sorted, duplicate input table rows dropped
+- chunk names are ignored
+- dynamics values are compared as floats, an int and the equal float hash alike
+Chunk ids, layer ids and sizes are kept as they are.
+
+FitnessCache memoises fitness values by key in a SQLite file, evicting the least recently used rows once
+max_entries is exceeded. hits/misses count lookups since the cache was opened.
+"""
+
+
+def _floats(value):  # a dynamics value (scalar or one per recovery variable) as floats, so -55 and -55.0 hash alike
+    if isinstance(value, (int, float)) or getattr(value, 'ndim', None) == 0:
+        return float(value)
+    return [float(v) for v in value]
+
+
+def _canonical_chunk(chunk):
+    inp = chunk['input']
+    external = dict(zip(inp['local_layer_assigned_id'], zip(inp['from_node'], inp['from_layer'])))
+    layers = []
+    for layer in chunk['layers']:
+        inputs = []
+        for input_id, ei in zip(layer['input_layers'], layer['exci_inhi']):
+            if input_id < 0:
+                ref = ("in",) + external[input_id] if input_id in external else ("missing", input_id)
+            else:
+                ref = ("local", input_id)
+            inputs.append((ref, bool(ei)))
+        dyn = layer['dynamics']
+        layers.append((layer['layer'], layer['size'], _floats(dyn['a']), _floats(dyn['b']), _floats(dyn['c']),
+                       _floats(dyn['d']), sorted(inputs)))
+    return chunk['id'], sorted(set(zip(inp['from_node'], inp['from_layer']))), layers
+
+
+def canonical_hash(brain_data):
+    canonical = [_canonical_chunk(chunk) for chunk in brain_data['chunks']]
+    return hashlib.sha256(json.dumps(canonical, separators=(',', ':')).encode()).hexdigest()
+
+
+class FitnessCache:
+    def __init__(self, path="fitness_cache.sqlite", max_entries=100000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS fitness (key TEXT PRIMARY KEY, value REAL, last_used INTEGER)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS fitness_lru ON fitness (last_used)")
+        self.clock = self.db.execute("SELECT COALESCE(MAX(last_used), 0) FROM fitness").fetchone()[0]
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM fitness").fetchone()[0]
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get_many(self, keys):  # {key: value} for the cached keys, marks them as used
+        keys = list(set(keys))
+        found = {}
+        for i in range(0, len(keys), 500):  # stay below the SQLite variable limit
+            part = keys[i:i + 500]
+            rows = self.db.execute(f"SELECT key, value FROM fitness WHERE key IN ({','.join('?' * len(part))})", part)
+            found.update(rows.fetchall())
+        if found:
+            self.clock += 1
+            with self.db:
+                self.db.executemany("UPDATE fitness SET last_used = ? WHERE key = ?",
+                                    [(self.clock, key) for key in found])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def put_many(self, items):  # items: {key: value}
+        self.clock += 1
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO fitness VALUES (?, ?, ?)",
+                                [(key, value, self.clock) for key, value in items.items()])
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                self.db.execute("DELETE FROM fitness WHERE key IN "
+                                "(SELECT key FROM fitness ORDER BY last_used LIMIT ?)", (excess,))
+
+    def put(self, key, value):
+        self.put_many({key: value})
+
+    def close(self):
+        self.db.close()
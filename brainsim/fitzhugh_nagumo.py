@@ -0,0 +1,81 @@
+import numpy as np
+
+"""
+4.2.6 dns https://www.izhikevich.org/publications/
+Model:
+dV/dt = V*(a - V)*(V - 1) - w + I
+dw/dt = b*V - c*w
+V approximation of membrane potential
+w recovery variable slow outward currents
+I injected current
+a shape of the cubic parabola V(a − V)*(V − 1)
+b and c kinetics recovery variable
+Constraints:
+b > 0
+c ≥ 0
+
+for multiple recovery variables: 
+b c and w become vectors
+dV/dt = V*(a − V)*(V − 1) − sum(w) + I
+
+Nullclines:
+w = V*(a − V)*(V − 1) + I
+w = b/c * V
+
+Linearized stability w/ I=0:
+tr(L) = −a − c < 0 
+det(L) = ac + b > 0
+"""
+
+
+class Sim:
+    def __init__(self, a, b, c, I):
+        self.Vsim = 0
+        self.wsim = 0
+        self.a = a
+        self.b = b
+        self.c = c
+        self.I = I
+
+    def updatevar(self, a, b, c, I):
+        self.a = a
+        self.b = b
+        self.c = c
+        self.I = I
+
+    def step(self):
+        self.Vsim = self.Vsim + (self.Vsim * (self.a - self.Vsim) * (self.Vsim - 1) - self.wsim + self.I)
+        self.wsim = self.wsim + (self.b * self.Vsim - self.c * self.wsim)
+        return self.Vsim, self.wsim
+
+
+
+def Vnullcline(V, a, I):
+    return V * (a - V) * (V - 1) + I
+
+
+def wnullcline(V, b, c):
+    return V * (b / c)
+
+
+def U_vec(X, Y, a, I):
+    return X * (np.full(X.shape, a) - X) * (X - np.ones(X.shape)) - Y + np.full(X.shape, I)
+
+
+def V_vec(X, Y, b, c):
+    return np.full(X.shape, b) * X - np.full(X.shape, c) * Y
+
+
+def field(X, Y, U, V, a, b, c, I, tmp=None):  # U_vec and V_vec written into U and V, tmp: scratch of X's shape
+    if tmp is None:
+        tmp = np.empty(np.shape(X))
+    np.subtract(a, X, out=U)
+    U *= X
+    np.subtract(X, 1, out=V)
+    U *= V
+    U -= Y
+    U += I
+    np.multiply(Y, c, out=V)
+    V *= -1
+    np.multiply(X, b, out=tmp)
+    V += tmp
@@ -0,0 +1,214 @@
+import io
+import os
+import gc
+import json
+import time
+import pickle
+import zipfile
+import tempfile
+import itertools
+import numpy
+from numpy.lib import format as npy_format
+
+"""
+Binary genome format
+
+The JSON genome ({"chunks": [...]}, see brain-data.json) is stored as flat typed tables in one uncompressed .npz,
+variable length lists are CSR style (values + offsets):
+
+chunks:  chunk_id, name_offsets + names (utf-8 bytes), input_offsets, layer_offsets
+inputs:  from_node, from_layer, local_id                                  (one row per input table entry)
+layers:  layer, size, c + c_is_int, {a,b,d}_offsets, layer_input_offsets  (one row per layer)
+dynamics: a, b, d + a_is_int, b_is_int, d_is_int                          (one row per list element)
+layer inputs: input_layers, exci_inhi + exci_inhi_offsets  (one row per entry, the two lists may differ in length)
+
+Numbers in the dynamics are kept as float64 with an is_int flag so that ints come back as ints and the round trip
+to JSON is lossless. Only the keys of the schema above are stored.
+save_genome/load_genome convert from/to the JSON dict, load_tables returns the raw arrays without building dicts.
+The members of the .npz are stored uncompressed, so load_tables(file_name, mmap=True) maps them read only straight
+from the file instead of reading them.
+"""
+
+
+def _flat(lists, dtype):
+    lists = list(lists)
+    offsets = numpy.zeros(len(lists) + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.fromiter(map(len, lists), dtype=numpy.int64, count=len(lists)), out=offsets[1:])
+    values = numpy.fromiter(itertools.chain.from_iterable(lists), dtype=dtype, count=int(offsets[-1]))
+    return values, offsets
+
+
+def _numbers(lists):  # float values, is_int flags and offsets of a list of number lists
+    values, offsets = _flat(lists, numpy.float64)
+    is_int = numpy.fromiter((type(x) is int for x in itertools.chain.from_iterable(lists)), dtype=bool,
+                            count=values.size)
+    return values, is_int, offsets
+
+
+def genome_tables(brain_data):
+    chunks = brain_data['chunks']
+    layers = [layer for chunk in chunks for layer in chunk['layers']]
+    names = [chunk['name'].encode('utf-8') for chunk in chunks]
+    tables = {}
+    tables['chunk_id'] = numpy.fromiter((chunk['id'] for chunk in chunks), dtype=numpy.int64, count=len(chunks))
+    tables['names'] = numpy.frombuffer(b''.join(names), dtype=numpy.uint8)
+    tables['name_offsets'] = numpy.zeros(len(chunks) + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.fromiter(map(len, names), dtype=numpy.int64, count=len(names)), out=tables['name_offsets'][1:])
+    inputs = [chunk['input'] for chunk in chunks]
+    tables['from_node'], tables['input_offsets'] = _flat((inp['from_node'] for inp in inputs), numpy.int64)
+    tables['from_layer'], _ = _flat((inp['from_layer'] for inp in inputs), numpy.int64)
+    tables['local_id'], _ = _flat((inp['local_layer_assigned_id'] for inp in inputs), numpy.int64)
+    tables['layer_offsets'] = numpy.zeros(len(chunks) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(chunk['layers']) for chunk in chunks], out=tables['layer_offsets'][1:])
+    tables['layer'] = numpy.fromiter((layer['layer'] for layer in layers), dtype=numpy.int64, count=len(layers))
+    tables['size'] = numpy.fromiter((layer['size'] for layer in layers), dtype=numpy.int64, count=len(layers))
+    c = [layer['dynamics']['c'] for layer in layers]
+    tables['c'] = numpy.array(c, dtype=numpy.float64).reshape(len(layers))
+    tables['c_is_int'] = numpy.fromiter((type(x) is int for x in c), dtype=bool, count=len(c))
+    for key in ('a', 'b', 'd'):
+        tables[key], tables[key + '_is_int'], tables[key + '_offsets'] = \
+            _numbers([layer['dynamics'][key] for layer in layers])
+    tables['input_layers'], tables['layer_input_offsets'] = _flat((layer['input_layers'] for layer in layers),
+                                                                  numpy.int64)
+    tables['exci_inhi'], tables['exci_inhi_offsets'] = _flat((layer['exci_inhi'] for layer in layers), bool)
+    return tables
+
+
+def _split(values, offsets):  # list of lists from values + offsets
+    values = values.tolist()
+    offsets = offsets.tolist()
+    return [values[lo:hi] for lo, hi in zip(offsets[:-1], offsets[1:])]
+
+
+def _split_numbers(values, is_int, offsets):
+    values = [int(x) if i else x for x, i in zip(values.tolist(), is_int.tolist())]
+    offsets = offsets.tolist()
+    return [values[lo:hi] for lo, hi in zip(offsets[:-1], offsets[1:])]
+
+
+def tables_genome(tables):  # inverse of genome_tables
+    enabled = gc.isenabled()
+    gc.disable()  # millions of small lists and dicts, none of them cyclic
+    try:
+        return _tables_genome(tables)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _tables_genome(tables):
+    names = tables['names'].tobytes()
+    name_offsets = tables['name_offsets'].tolist()
+    from_node = _split(tables['from_node'], tables['input_offsets'])
+    from_layer = _split(tables['from_layer'], tables['input_offsets'])
+    local_id = _split(tables['local_id'], tables['input_offsets'])
+    dyn = {key: _split_numbers(tables[key], tables[key + '_is_int'], tables[key + '_offsets']) for key in 'abd'}
+    c = [int(x) if i else x for x, i in zip(tables['c'].tolist(), tables['c_is_int'].tolist())]
+    input_layers = _split(tables['input_layers'], tables['layer_input_offsets'])
+    exci_inhi = _split(tables['exci_inhi'], tables['exci_inhi_offsets'])
+    layers = [{"layer": layer,
+               "size": size,
+               "dynamics": {"a": a, "b": b, "c": ci, "d": d},
+               "input_layers": il,
+               "exci_inhi": ei
+               } for layer, size, a, b, ci, d, il, ei in
+              zip(tables['layer'].tolist(), tables['size'].tolist(), dyn['a'], dyn['b'], c, dyn['d'], input_layers,
+                  exci_inhi)]
+    layer_offsets = tables['layer_offsets'].tolist()
+    chunks = []
+    for ci, chunk_id in enumerate(tables['chunk_id'].tolist()):
+        chunks.append({'id': chunk_id,
+                       'name': names[name_offsets[ci]:name_offsets[ci + 1]].decode('utf-8'),
+                       'input': {"from_node": from_node[ci], "from_layer": from_layer[ci],
+                                 "local_layer_assigned_id": local_id[ci]},
+                       'layers': layers[layer_offsets[ci]:layer_offsets[ci + 1]]})
+    return {'chunks': chunks}
+
+
+def save_genome(brain_data, file_name):
+    numpy.savez(file_name, **genome_tables(brain_data))
+
+
+def load_tables(file_name, mmap=False):
+    if not mmap:
+        with numpy.load(file_name) as npz:
+            return {key: npz[key] for key in npz.files}
+    tables = {}
+    with zipfile.ZipFile(file_name) as zf, open(file_name, 'rb') as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} is compressed and can not be memory mapped")
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_len = int.from_bytes(local_header[26:28], 'little')
+            extra_len = int.from_bytes(local_header[28:30], 'little')
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            read_header = npy_format.read_array_header_1_0 if npy_format.read_magic(f) == (1, 0) else \
+                npy_format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            key = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if numpy.prod(shape) == 0:
+                tables[key] = numpy.zeros(shape, dtype=dtype)
+            else:
+                tables[key] = numpy.memmap(file_name, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                           order='F' if fortran_order else 'C')
+    return tables
+
+
+def load_genome(file_name):
+    return tables_genome(load_tables(file_name))
+
+
+def dumps_genome(brain_data):  # compact bytes to ship a genome to another process: the tables, ints narrowed to int32
+    tables = genome_tables(brain_data)
+    for key, values in tables.items():
+        if values.dtype == numpy.int64 and (values.size == 0 or
+                                            -2 ** 31 <= values.min() and values.max() < 2 ** 31):
+            tables[key] = values.astype(numpy.int32)
+    return pickle.dumps(tables, protocol=5)
+
+
+def loads_genome(data):
+    tables = pickle.loads(data)
+    return tables_genome({key: values.astype(numpy.int64) if values.dtype == numpy.int32 else values
+                          for key, values in tables.items()})
+
+
+def benchmark(brain_data, repeats=1):  # seconds for JSON/binary save and load
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:  # the memory mapped file
+        file_name = os.path.join(tmpdir, "genome_benchmark.npz")
+        save_genome(brain_data, file_name)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            load_tables(file_name, mmap=True)
+        results['npz_mmap_tables'] = (time.perf_counter() - start) / repeats
+    for fmt, save, load in (('json', lambda f: json.dump(brain_data, f), lambda f: json.load(f)),
+                            ('npz', lambda f: save_genome(brain_data, f), lambda f: load_genome(f))):
+        buf = io.StringIO() if fmt == 'json' else io.BytesIO()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            buf.seek(0)
+            save(buf)
+        results[fmt + '_save'] = (time.perf_counter() - start) / repeats
+        results[fmt + '_bytes'] = len(buf.getvalue())
+        start = time.perf_counter()
+        for _ in range(repeats):
+            buf.seek(0)
+            loaded = load(buf)
+        results[fmt + '_load'] = (time.perf_counter() - start) / repeats
+        assert loaded == brain_data
+    return results
+
+
+if __name__ == "__main__":
+    from .grey_white_matter import scale_brain
+    with open("brain-data.json") as bf:
+        sample = json.load(bf)
+    for copies in (1, 1000, 100000, 200000):
+        data = scale_brain(sample, copies=copies)
+        r = benchmark(data)
+        layers = sum(len(chunk['layers']) for chunk in data['chunks'])
+        print(f"{layers:>8} layers  json save {r['json_save']:8.3f}s load {r['json_load']:8.3f}s "
+              f"{r['json_bytes'] / 1e6:8.1f}MB | npz save {r['npz_save']:8.3f}s load {r['npz_load']:8.3f}s "
+              f"{r['npz_bytes'] / 1e6:8.1f}MB | mmap tables {r['npz_mmap_tables']:8.4f}s")
@@ -0,0 +1,202 @@
+import time
+import copy
+import numpy
+import json
+from .populations import Izhikevich2003Population
+from .synapses import compile_projections
+from .topology import Topology
+
+
+class Layer:  # one genome layer, V/u/spike are views into the arrays of its GreyMatter region
+    def __init__(self, layer_data, offset, region):
+        self.id = layer_data['layer']
+        self.size = layer_data['size']
+        self.offset = offset
+        self.input_layers = layer_data['input_layers']
+        self.exci_inhi = layer_data['exci_inhi']
+        self.slice = slice(offset, offset + self.size)
+        self.V = region.population.V[self.slice]
+        self.u = region.population.u[:, self.slice]
+        self.spike = region.population.spike[self.slice]
+        self.pending = region.pending[:, self.slice]  # delay ring buffer of the input current of this layer
+
+
+class GreyMatter:  # one chunk of the genome, all its layers share preallocated state arrays and step together
+    def __init__(self, name, id, layers=(), dt=0.5, noise=5.0, seed=None, max_delay=1, backend="numpy"):
+        self.name = name
+        self.id = id
+        self.iteration = 0
+        self.dt = dt
+        self.noise = noise  # std of the random thalamic input current, 0 disables it
+        self.rng = numpy.random.default_rng(seed)
+        sizes = [layer['size'] for layer in layers]
+        self.size = sum(sizes)
+        m = max([len(layer['dynamics']['a']) for layer in layers], default=1)
+        a = numpy.zeros((m, self.size))
+        b = numpy.zeros((m, self.size))
+        d = numpy.zeros((m, self.size))
+        c = numpy.zeros(self.size)
+        offset = 0
+        for layer, size in zip(layers, sizes):
+            dyn = layer['dynamics']
+            sl = slice(offset, offset + size)
+            a[:len(dyn['a']), sl] = numpy.reshape(dyn['a'], (-1, 1))
+            b[:len(dyn['b']), sl] = numpy.reshape(dyn['b'], (-1, 1))
+            d[:len(dyn['d']), sl] = numpy.reshape(dyn['d'], (-1, 1))
+            c[sl] = dyn['c']
+            offset += size
+        self.population = Izhikevich2003Population(self.size, a, b, c, d, dt=dt, m=m, backend=backend)
+        # slot t % D holds the synaptic current arriving at step t, D = max_delay + 1 so no slot is overwritten early
+        self.pending = numpy.zeros((max_delay + 1, self.size))
+        self.layers = []
+        offset = 0
+        for layer, size in zip(layers, sizes):
+            self.layers.append(Layer(layer, offset, self))
+            offset += size
+        self.I_in = numpy.zeros(self.size)  # total input current of the current step
+        self.bounds = numpy.cumsum([0] + sizes)
+        self.spiking = numpy.zeros(0, dtype=numpy.int64)  # sorted indices of the neurons that spiked last step
+        self.no_spikes = [self.spiking] * len(self.layers)
+        self.layer_spiking = self.no_spikes  # same, split per layer in layer local indices
+
+    def step(self):  # advances every layer of the region in one batched update
+        I_syn = self.pending[self.iteration % self.pending.shape[0]]
+        if self.noise:
+            self.rng.standard_normal(out=self.I_in)
+            self.I_in *= self.noise
+            self.I_in += I_syn
+        else:
+            self.I_in[:] = I_syn
+        I_syn[:] = 0
+        self.population.step(self.I_in)
+        self.spiking = numpy.flatnonzero(self.population.spike)
+        if self.spiking.size:
+            cuts = self.spiking.searchsorted(self.bounds)
+            self.layer_spiking = [self.spiking[lo:hi] - offset for lo, hi, offset in
+                                  zip(cuts[:-1], cuts[1:], self.bounds[:-1])]
+        else:
+            self.layer_spiking = self.no_spikes
+        self.iteration += 1
+        return self.population.spike
+
+    def get_iteration(self):
+        return self.iteration
+
+
+class WhiteMatter:  # contains the connectome and manages the data transfer between the regions (GreyMatter) as well
+    # as time stepping
+    def __init__(self, json_brainfile, dt=0.5, noise=5.0, fan_in=32, local_delay=1, remote_delay=4,
+                 seed=None, backend="numpy"):  # json_brainfile: path or already loaded dict, backend of the populations
+        self.grey_matter = []
+        if isinstance(json_brainfile, dict):
+            self.brain_data = json_brainfile
+        else:
+            with open(json_brainfile) as bf:
+                self.brain_data = json.load(bf)
+        self.topology = Topology(self.brain_data)
+        seeds = numpy.random.SeedSequence(seed).spawn(len(self.brain_data['chunks']) + 1)
+        self.projections = compile_projections(self.brain_data, fan_in=fan_in, local_delay=local_delay,
+                                               remote_delay=remote_delay, seed=seeds[-1], topology=self.topology)
+        self.max_delay = max([proj.delay for proj in self.projections], default=1)
+        self.min_remote_delay = min([proj.delay for proj in self.projections if proj.source[0] != proj.target[0]],
+                                    default=self.max_delay)
+        for chunks, region_seed in zip(self.brain_data['chunks'], seeds):
+            self.grey_matter.append(GreyMatter(chunks['name'], chunks['id'], chunks['layers'], dt, noise, region_seed,
+                                               self.max_delay, backend))
+        self.profiler = None  # brainsim.profiling.Profiler while one is attached
+        self.recorders = []  # record() of each is called after every step_all(), see brainsim.spike_recorder and
+        # brainsim.probes
+        self.scatter = None  # Projection.propagate, or its torch version for backend "torch"
+        if backend == "torch":
+            from .torch_backend import propagate
+            self.scatter = propagate
+        self.outgoing = [[] for _ in self.grey_matter]  # projections grouped by source region
+        for proj in self.projections:
+            self.outgoing[proj.source[0]].append(proj)
+
+    def get_region_list(self):
+        return self.grey_matter
+
+    def get_connectome(self):  # networkx MultiDiGraph for plotting and analysis, built on first call
+        return self.topology.to_networkx()
+
+    def step_all(self):
+        if self.profiler is not None:
+            self.profiler.step_all()
+        else:
+            for region in self.grey_matter:
+                region.step()
+            self.propagate()
+        for recorder in self.recorders:
+            recorder.record()
+
+    def propagate(self):  # scatters the spikes of the last step into the ring slot (t + delay) % D of each target
+        for i in range(len(self.grey_matter)):
+            self.propagate_region(i)
+
+    def propagate_region(self, i, events=None):  # the outgoing projections of region i, events[k] += synaptic events
+        # delivered by its k-th outgoing projection
+        region = self.grey_matter[i]
+        if region.spiking.size == 0:
+            return
+        t = region.iteration - 1
+        for k, proj in enumerate(self.outgoing[i]):
+            spiking = region.layer_spiking[proj.source[1]]
+            target = self.grey_matter[proj.target[0]].layers[proj.target[1]]
+            slot = target.pending[(t + proj.delay) % target.pending.shape[0]]
+            if self.scatter is None:
+                delivered = proj.propagate(spiking, slot)
+            else:
+                delivered = self.scatter(proj, spiking, slot)
+            if events is not None:
+                events[k] += delivered
+
+
+def scale_brain(brain_data, copies=1, size_factor=1):  # tiles the chunks copies times and multiplies layer sizes
+    n = len(brain_data['chunks'])
+    scaled = {'chunks': []}
+    for rep in range(copies):
+        for chunk in brain_data['chunks']:
+            chunk = copy.deepcopy(chunk)
+            chunk['id'] += rep * n
+            chunk['name'] = f"{chunk['name']}_{rep}"
+            chunk['input']['from_node'] = [node + rep * n for node in chunk['input']['from_node']]
+            for layer in chunk['layers']:
+                layer['size'] *= size_factor
+            scaled['chunks'].append(chunk)
+    return scaled
+
+
+def benchmark(brain_data, steps=1000, backend="numpy"):  # steps/second of WhiteMatter.step_all
+    brain = WhiteMatter(brain_data, seed=0, backend=backend)
+    brain.step_all()  # warm-up
+    start = time.perf_counter()
+    for _ in range(steps):
+        brain.step_all()
+    elapsed = time.perf_counter() - start
+    neurons = sum(region.size for region in brain.grey_matter)
+    return steps / elapsed, neurons * steps / elapsed
+
+
+if __name__ == "__main__":
+    with open("brain-data.json") as bf:
+        sample = json.load(bf)
+    for label, data, steps in (("sample brain", sample, 5000),
+                               ("1000x chunks", scale_brain(sample, copies=1000), 20),
+                               ("1000x layer size", scale_brain(sample, size_factor=1000), 50)):
+        steps_s, neuron_steps_s = benchmark(data, steps)
+        print(f"{label:>18}: {steps_s:10.1f} steps/s  {neuron_steps_s:.3e} neuron-steps/s")
+
+    filename = "brain2.json"
+    brain1 = WhiteMatter(filename)
+    grey_mater = brain1.get_region_list()
+    brain1.step_all()
+    for i in grey_mater:
+        print(i.get_iteration())
+
+    import networkx as nx
+    import matplotlib.pyplot as plt
+    brain_graph = brain1.get_connectome()
+    fig = plt.figure()
+    nx.draw(brain_graph, with_labels=True)
+    plt.show()
@@ -0,0 +1,325 @@
+import time
+import numpy as np
+from . import izhikevich, izhikevich_simple, izhikevich2003, fitzhugh_nagumo
+from .analysis import defaults
+from .populations import _input
+
+"""
+Selectable integrators with an explicit dt for the explorer models, on batched state
+
+Neurons(model, n, dt, method, **params) holds V and u (w for FitzHugh-Nagumo) of n neurons of one of the four
+explorer models. The right hand side is the in place field() of the model module, every parameter is a scalar or an
+array of length n. method is a name from integrators or a callable method(neurons, V, u, dt) -> (V, u):
+
+euler          V and u from the state at the start of the step
+semi_implicit  V first, then u from the new V: the split step of the Sim classes
+rk4            classic Runge-Kutta, 4 field evaluations per step
+exponential    V as semi_implicit, u exact for V frozen over the step. du/dt = alpha(V) - beta*u is linear in u
+               (beta = a, c for FitzHugh-Nagumo), so u relaxes by exp(-beta*dt) and stays stable for any dt
+adaptive       Heun with the Euler step as error estimate: the neurons whose V error exceeds tol repeat the step
+               in 2, 4, ... max_substeps substeps, all others take one
+
+A neuron above Vpeak after the step is reset (V <- c, u <- u + d) and reported as in the populations, V padded to
+Vpeak. FitzHugh-Nagumo has no reset. The spike time is then the end of the step, quantised to dt, and the reset
+comes late by up to dt, an error that adds up over the spikes of a train. With interpolate=True the steps that
+cross Vpeak are redone in split substeps, the crossing substep is split again down to spike_tol and the crossing
+interpolated inside it. The neuron is reset at that time and integrated over the rest of the step, and step()
+returns the time of the spike within the step (spike_t) after the spike flags; the other steps cost nothing
+extra.
+
+dt defaults to the step of the Sim classes (1, 0.2 for izhikevich2003), so semi_implicit at the default dt is the
+explorer update; izhikevich_simple follows the -u of its model equations.
+
+backend="numba" runs the semi_implicit step without interpolation as one fused compiled kernel per model
+(brainsim.kernels), any other combination and a missing Numba keep the NumPy step.
+
+benchmark() runs the 20 regimes of izhikevich2003 with every method over a range of dt against a fine interpolated
+rk4 reference, largest_dt() picks the coarsest dt of each method that keeps the spike times within a tolerance.
+"""
+
+models = {  # field(), its parameters after (X, Y, U, V), the rate of the linear recovery, reset, default dt
+    "izhikevich": (izhikevich.field, ("Vr", "Vt", "k", "C", "I", "a", "b"), "a",
+                   dict(Vpeak=35.0, c=-50.0, d=100.0), 1.0),
+    "izhikevich_simple": (izhikevich_simple.field, ("I", "a", "b"), "a", dict(Vpeak=1.0, c=-0.5, d=1.0), 1.0),
+    "izhikevich2003": (izhikevich2003.field, ("I", "a", "b"), "a", dict(Vpeak=30.0, c=-65.0, d=6.0), 0.2),
+    "fitzhugh_nagumo": (fitzhugh_nagumo.field, ("a", "b", "c", "I"), "c", None, 1.0),
+}
+
+
+def euler(neurons, V, u, dt, idx=None):
+    dV, du = neurons.field(V, u, idx)
+    return V + dt * dV, u + dt * du
+
+
+def semi_implicit(neurons, V, u, dt, idx=None):
+    dV, _ = neurons.field(V, u, idx)
+    V = V + dt * dV
+    _, du = neurons.field(V, u, idx)
+    return V, u + dt * du
+
+
+def rk4(neurons, V, u, dt, idx=None):
+    k1V, k1u = neurons.field(V, u, idx)
+    k2V, k2u = neurons.field(V + 0.5 * dt * k1V, u + 0.5 * dt * k1u, idx)
+    k3V, k3u = neurons.field(V + 0.5 * dt * k2V, u + 0.5 * dt * k2u, idx)
+    k4V, k4u = neurons.field(V + dt * k3V, u + dt * k3u, idx)
+    return V + dt / 6 * (k1V + 2 * k2V + 2 * k3V + k4V), u + dt / 6 * (k1u + 2 * k2u + 2 * k3u + k4u)
+
+
+def exponential(neurons, V, u, dt, idx=None):
+    dV, _ = neurons.field(V, u, idx)
+    V = V + dt * dV
+    _, du = neurons.field(V, u, idx)
+    beta = neurons.decay if idx is None else neurons.decay[idx]
+    # u + du*(1 - exp(-beta*dt))/beta, the Euler step dt*du for beta = 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h = np.where(beta != 0, -np.expm1(-beta * dt) / beta, dt)
+    return V, u + h * du
+
+
+def _heun(neurons, V, u, dt, idx):  # Heun step of the neurons idx and its V difference to the Euler step
+    k1V, k1u = neurons.field(V, u, idx)
+    k2V, k2u = neurons.field(V + dt * k1V, u + dt * k1u, idx)
+    return V + 0.5 * dt * (k1V + k2V), u + 0.5 * dt * (k1u + k2u), 0.5 * dt * np.abs(k2V - k1V)
+
+
+def adaptive(neurons, V, u, dt, idx=None):
+    Vn, un, err = _heun(neurons, V, u, dt, idx)
+    redo = np.flatnonzero(~(err <= neurons.tol))
+    dt = np.broadcast_to(dt, V.shape)
+    k = 2
+    while redo.size and k <= neurons.max_substeps:
+        sub = redo if idx is None else idx[redo]
+        Vs, us, h = V[redo], u[redo], dt[redo] / k
+        Vpeak = neurons.Vpeak[sub] if neurons.reset else np.inf
+        worst = np.zeros(redo.size)
+        for _ in range(k):
+            Vh, uh, e = _heun(neurons, Vs, us, h, sub)
+            live = Vs <= Vpeak  # a neuron past Vpeak waits for the reset at the end of the step
+            Vs = np.where(live, Vh, Vs)
+            us = np.where(live, uh, us)
+            np.maximum(worst, np.where(live & (Vh <= Vpeak), e, 0), out=worst)  # the upstroke is reset anyway
+        Vn[redo], un[redo] = Vs, us
+        redo = redo[~(worst <= neurons.tol)]
+        k *= 2
+    return Vn, un
+
+
+integrators = {"euler": euler, "semi_implicit": semi_implicit, "rk4": rk4, "exponential": exponential,
+               "adaptive": adaptive}
+
+
+class Neurons:  # n neurons of one explorer model, stepped with a selectable integrator
+    def __init__(self, model, n=1, dt=None, method="semi_implicit", V0=0.0, u0=0.0, tol=0.1, max_substeps=64,
+                 interpolate=False, spike_tol=0.02, split=4, backend="numpy", **params):
+        if model not in models:
+            raise ValueError(f"unknown model {model!r}, one of {sorted(models)}")
+        self._field, self.params, decay, reset, default_dt = models[model]
+        self.model = model
+        self.n = n
+        self.dt = default_dt if dt is None else dt
+        self.method = integrators[method] if isinstance(method, str) else method
+        self.tol = tol  # adaptive: largest V error [mV] of one Heun step
+        self.max_substeps = max_substeps
+        self.reset = reset is not None
+        self.interpolate = interpolate and self.reset
+        self.spike_tol = spike_tol  # interpolate: the crossing is bracketed to spike_tol [ms], then interpolated
+        self.split = split  # interpolate: substeps per refinement of the bracket
+        names = self.params + tuple(reset or ())
+        p = {name: defaults[model].get(name, (reset or {}).get(name)) for name in names}
+        unknown = set(params) - set(p)
+        if unknown:
+            raise ValueError(f"{model} has no parameter {sorted(unknown)}")
+        for name in names:
+            setattr(self, name, np.empty(n, dtype=np.float64))
+        self.updatevar(**dict(p, **params))
+        self.decay = getattr(self, decay)
+        self.V = np.full(n, V0, dtype=np.float64)
+        self.u = np.full(n, u0, dtype=np.float64)
+        self.spike = np.zeros(n, dtype=bool)
+        self.V_out = np.zeros(n, dtype=np.float64)
+        self.u_out = np.zeros(n, dtype=np.float64)
+        self.spike_t = np.full(n, np.nan)  # time of the spike within the last step [ms], NaN for none
+        self._kernel = None
+        if backend == "numba" and self.method is semi_implicit and not self.interpolate:
+            from . import kernels
+            if kernels.available:
+                self._kernel = kernels.kernels[model]
+                self._kernel_args = [getattr(self, name) for name in names]
+
+    def updatevar(self, **params):  # scalars or arrays of length n by name, copied in place
+        for name, val in params.items():
+            getattr(self, name)[:] = val
+
+    def field(self, V, u, idx=None):  # (dV/dt, du/dt) of the neurons idx (all for None)
+        dV = np.empty_like(V)
+        du = np.empty_like(u)
+        args = [getattr(self, name) for name in self.params]
+        if idx is not None:
+            args = [x[idx] for x in args]
+        self._field(V, u, dV, du, *args)
+        return dV, du
+
+    def step(self, I_ext=None):
+        # one dt, returns V (Vpeak padded), u before the reset and the spikes, with interpolate also spike_t
+        if self._kernel is not None:
+            self._kernel(self.V, self.u, _input(I_ext, self.n), self.dt, *self._kernel_args, self.V_out, self.u_out,
+                         self.spike)
+            return self.V_out, self.u_out, self.spike
+        if I_ext is not None:
+            I = self.I.copy()
+            self.I += I_ext
+        with np.errstate(over='ignore', invalid='ignore'):
+            V, u = self.method(self, self.V, self.u, self.dt)
+            crossed = np.flatnonzero(~(V <= self.Vpeak)) if self.interpolate else ()
+            if len(crossed):
+                self._exact(crossed, V, u)
+        if I_ext is not None:
+            self.I[:] = I
+        if not len(crossed):
+            self.V[:], self.u[:] = V, u
+            np.copyto(self.V_out, self.V)
+            np.copyto(self.u_out, self.u)
+            if self.reset:
+                spike = np.logical_not(self.V <= self.Vpeak, out=self.spike)  # NaN after a blow up counts as a spike
+                np.copyto(self.V_out, self.Vpeak, where=spike)
+                np.copyto(self.V, self.c, where=spike)
+                np.add(self.u, self.d, out=self.u, where=spike)
+            if self.interpolate:
+                self.spike_t.fill(np.nan)
+        if self.interpolate:
+            return self.V_out, self.u_out, self.spike, self.spike_t
+        return self.V_out, self.u_out, self.spike
+
+    def _locate(self, idx, V, u):
+        # first Vpeak crossing of the neurons idx within dt from (V, u): the step is redone in split substeps, the
+        # substep that crosses is split again until it is shorter than spike_tol, the crossing is interpolated
+        # linearly inside it. Returns the spiking subset of idx, its crossing time and u there, and the end of
+        # step state of the neurons whose crossing the substeps do not confirm
+        n, method, Vpeak = self.split, self.method, self.Vpeak[idx]
+        t = np.zeros(idx.size)
+        span = self.dt
+        first = True
+        while True:
+            h = span / n
+            j_cross = np.full(idx.size, -1)
+            Vs, us, Vb, ub = V, u, V, u
+            for j in range(n):
+                live = j_cross < 0
+                Vb, ub = np.where(live, Vs, Vb), np.where(live, us, ub)  # start of the crossing substep
+                Vn, un = method(self, Vs, us, h, idx)
+                Vs, us = np.where(live, Vn, Vs), np.where(live, un, us)
+                j_cross[live & ~(Vn <= Vpeak)] = j
+            if first:
+                spiking = j_cross >= 0
+                missed = (idx[~spiking], Vs[~spiking], us[~spiking])
+                idx, t, j_cross, Vb, ub, Vpeak = idx[spiking], t[spiking], j_cross[spiking], Vb[spiking], \
+                    ub[spiking], Vpeak[spiking]
+                first = False
+            j_cross[j_cross < 0] = n - 1  # not confirmed by the finer substeps: the crossing is at the end
+            t += j_cross * h
+            V, u, span = Vb, ub, h
+            if span <= self.spike_tol or not idx.size:
+                break
+        Vn, un = method(self, V, u, span, idx)
+        frac = np.clip((Vpeak - V) / (Vn - V), 0, 1)
+        frac[~np.isfinite(frac)] = 1.0
+        return idx, t + frac * span, u + frac * (un - u), missed
+
+    def _exact(self, crossed, V, u):
+        # reset the crossed neurons at their crossing time and integrate the rest of the step from the reset
+        idx, t, u_cross, (missed, V_missed, u_missed) = self._locate(crossed, self.V[crossed], self.u[crossed])
+        V[missed], u[missed] = V_missed, u_missed
+        Vr, ur = self.c[idx], u_cross + self.d[idx]
+        Vr, ur = self.method(self, Vr, ur, self.dt - t, idx)
+        self.V[:], self.u[:] = V, u
+        np.copyto(self.V_out, V)
+        np.copyto(self.u_out, u)
+        self.V[idx], self.u[idx] = Vr, ur
+        self.V_out[idx], self.u_out[idx] = self.Vpeak[idx], u_cross
+        self.spike.fill(False)
+        self.spike[idx] = True
+        self.spike_t.fill(np.nan)
+        self.spike_t[idx] = t
+        # a second crossing within the rest of the step is reset at the end of the step, its time is not reported
+        again = idx[~(Vr <= self.Vpeak[idx])]
+        self.V[again] = self.c[again]
+        self.u[again] += self.d[again]
+
+    def run(self, duration):  # steps for duration [ms], returns the spike times [ms] of every neuron
+        steps = int(round(duration / self.dt))
+        spike_times, spike_idx = [], []
+        for i in range(steps):
+            spike = self.step()[2]
+            if spike.any():
+                idx = np.flatnonzero(spike)
+                offset = self.spike_t[idx] if self.interpolate else np.full(idx.size, self.dt)
+                spike_times.append(i * self.dt + offset)
+                spike_idx.append(idx)
+        if not spike_times:
+            return [np.zeros(0) for _ in range(self.n)]
+        spike_times, spike_idx = np.concatenate(spike_times), np.concatenate(spike_idx)
+        order = np.argsort(spike_idx, kind='stable')
+        counts = np.bincount(spike_idx, minlength=self.n)
+        return np.split(spike_times[order], np.cumsum(counts)[:-1])
+
+
+def spike_error(spikes, reference, duration, margin=50.0):
+    # per neuron the largest distance [ms] between a spike and the nearest spike of the other train (Hausdorff), inf
+    # if a train has no counterpart. The reference runs margin ms longer, spikes closer than margin to the end are
+    # not required
+    errors = np.zeros(len(reference))
+    for i, (s, r) in enumerate(zip(spikes, reference)):
+        inner = r[r < duration - margin]
+        if s.size == 0 or r.size == 0:
+            errors[i] = np.inf if s.size or inner.size else 0.0
+            continue
+        errors[i] = np.abs(s[:, None] - r[None, :]).min(axis=1).max()
+        if inner.size:
+            errors[i] = max(errors[i], np.abs(inner[:, None] - s[None, :]).min(axis=1).max())
+    return errors
+
+
+def _regimes(method, dt, **kw):
+    from .regimes import par
+    a, b, c, d, I = np.asarray(par, dtype=np.float64).T
+    return Neurons("izhikevich2003", len(a), dt, method, V0=-65.0, u0=-65.0 * b, a=a, b=b, c=c, d=d, I=I, **kw)
+
+
+def benchmark(duration=300.0, methods=tuple(integrators), dts=(0.05, 0.1, 0.2, 0.5, 1.0), reference_dt=0.005,
+              interpolate=False):
+    # {(method, dt): (spike time error of every regime [ms], wall seconds)} for the 20 regimes of izhikevich2003
+    reference = _regimes("rk4", reference_dt, interpolate=True).run(duration + 50.0)
+    results = {}
+    for method in methods:
+        for dt in dts:
+            neurons = _regimes(method, dt, interpolate=interpolate)
+            start = time.perf_counter()
+            spikes = neurons.run(duration)
+            elapsed = time.perf_counter() - start
+            results[method, dt] = (spike_error(spikes, reference, duration), elapsed)
+    return results
+
+
+def largest_dt(results, tolerance=1.0, quantile=0.5):
+    # {method: (dt, seconds)}, the coarsest dt whose error quantile over the regimes is within tolerance [ms], and
+    # that of all finer dt too. The bursting regimes change their spike count with any dt, quantile=1 is strict
+    best, failed = {}, set()
+    for (method, dt), (errors, seconds) in sorted(results.items(), key=lambda r: r[0][1]):
+        if np.quantile(errors, quantile) > tolerance:
+            failed.add(method)
+        elif method not in failed:
+            best[method] = (dt, seconds)
+    return best
+
+
+if __name__ == "__main__":
+    for interpolate in (False, True):
+        print("interpolated spike times" if interpolate else "spike times at the end of the step")
+        results = benchmark(interpolate=interpolate)
+        for (method, dt), (errors, seconds) in results.items():
+            print(f"{method:>13} dt={dt:<5} spike time error median {np.median(errors):7.3f} ms, "
+                  f"{(errors <= 1).sum():2d}/20 within 1 ms  {seconds * 1e3:7.1f} ms wall")
+        for method, (dt, seconds) in largest_dt(results).items():
+            print(f"{method:>13}: largest dt with a median error within 1 ms is {dt}, {seconds * 1e3:.1f} ms wall "
+                  f"per 300 ms simulated")
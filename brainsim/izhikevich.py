@@ -0,0 +1,98 @@
+import numpy as np
+
+"""
+5.2.4  dns https://www.izhikevich.org/publications/
+
+Model:
+dV/dt  = (k*(V - Vr)*(V - Vt) - u + I)/C
+du/dt = a*(b*(V - Vr) - u)
+
+if v ≥ 1, then
+v <- c, u <- u + d
+
+V approximation of membrane potential
+u recovery variable slow outward currents
+I injected current
+a, b recovery dynamics
+c reset v value
+d update recovery value u
+
+for multiple recovery variables: 
+a b d and w become vectors
+dV/dt = I + v^2 - sum(u)
+
+Nullclides:
+u = k*(V - Vr)*(V - Vt) + I
+u = b*(V - Vr) 
+"""
+
+
+def update(V, u, Vr, Vt, k, C, I, a, b, I_ext=0.0):  # the split step, V first and u from the new V, on floats or
+    # arrays: the operations and their order of IzhikevichPopulation.step, which does them in place
+    V = V + ((V - Vr) * k * (V - Vt) - u + I + I_ext) / C
+    u = u + ((V - Vr) * b - u) * a
+    return V, u
+
+
+class Sim:  # single neuron on Python floats, the state of one neuron of IzhikevichPopulation
+    def __init__(self, Vr, Vt, Vpeak, a, b, c, d, k, I, C):
+        self.Vsim = 0.0
+        self.usim = 0.0
+        self.updatevar(Vr, Vt, Vpeak, a, b, c, d, k, I, C)
+
+    def updatevar(self, Vr, Vt, Vpeak, a, b, c, d, k, I, C):
+        self.Vr = Vr
+        self.Vt = Vt
+        self.Vpeak = Vpeak
+        self.a = a
+        self.b = b
+        self.c = c
+        self.d = d
+        self.k = k
+        self.I = I
+        self.C = C
+
+    def step(self, I_ext=0.0):
+        self.Vsim, self.usim = update(self.Vsim, self.usim, self.Vr, self.Vt, self.k, self.C, self.I, self.a, self.b,
+                                      I_ext)
+        if self.Vsim > self.Vpeak:
+            upad = self.usim
+            self.Vsim = self.c
+            self.usim = self.usim + self.d
+            return self.Vpeak, upad, 1  # padding for consistent spikes
+        return self.Vsim, self.usim, 0
+
+
+def Vnullcline(V, Vr, Vt, k, I):
+    return k * (V - Vr) * (V - Vt) + I
+
+
+def unullcline(V, Vr, b):
+    return b * (V - Vr)
+
+
+def U_vec(X, Y, Vt, Vr, k, C, I):
+    return (np.full(X.shape, k) * (X - np.full(X.shape, Vr)) * (X - np.full(X.shape, Vt)) - Y + np.full(X.shape, I)) / np.full(X.shape, C)
+
+
+def V_vec(X, Y, a, b, Vr):
+    return np.full(X.shape, a)*(np.full(X.shape, b)*(X - np.full(X.shape, Vr)) - Y)
+
+
+def normalize(U, V):
+    norm = np.hypot(U, V)
+    return U / norm, V / norm
+
+
+def field(X, Y, U, V, Vr, Vt, k, C, I, a, b):  # U_vec and V_vec written into U and V
+    np.subtract(X, Vr, out=U)
+    U *= k
+    np.subtract(X, Vt, out=V)
+    U *= V
+    U -= Y
+    U += I
+    U /= C
+    np.subtract(X, Vr, out=V)
+    V *= b
+    V -= Y
+    V *= a
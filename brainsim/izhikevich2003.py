@@ -0,0 +1,97 @@
+import numpy as np
+
+"""
+5.2.4  dns https://www.izhikevich.org/publications/
+
+Model:
+dV/dt  = 0.04 * vp^2 + 5 * v + 140 - u + I
+du/dt = a*(b*V - u)
+
+if V ≥ Vpeak, then
+V <- c, u <- u + d
+
+V approximation of membrane potential
+u recovery variable slow outward currents
+I injected current
+a, b recovery dynamics
+c reset v value
+d update recovery value u
+
+for multiple recovery variables: 
+a b d and w become vectors
+dV/dt = I + v^2 - sum(u)
+
+Nullclides:
+u = k*(V - Vr)*(V - Vt) + I
+u = b*(V - Vr) 
+"""
+
+
+class Sim:
+    def __init__(self, Vpeak, a, b, c, d, I):
+        self.Vsim = 0
+        self.usim = 0
+        self.Vpeak = Vpeak
+        self.a = a
+        self.b = b
+        self.c = c
+        self.d = d
+        self.I = I
+
+    def updatevar(self, Vpeak, a, b, c, d, I):
+        self.Vpeak = Vpeak
+        self.a = a
+        self.b = b
+        self.c = c
+        self.d = d
+        self.I = I
+
+    def step(self):
+        spike = 0
+        self.Vsim = self.Vsim + 0.2*(0.04 * self.Vsim ** 2 + 5 * self.Vsim + 140 - self.usim + self.I)
+        self.usim = self.usim + 0.2*(self.a * (self.b * self.Vsim - self.usim))
+        if self.Vsim > self.Vpeak:
+            spike = 1
+            upad = self.usim
+            self.Vsim = self.c
+            self.usim = self.usim + self.d
+            return self.Vpeak, upad, spike  # padding for consistent spikes
+        else:
+            return self.Vsim, self.usim, spike
+
+    def setvu(self, v, u):
+        self.Vsim = v
+        self.usim = u
+
+
+
+def Vnullcline(V, I):
+    return 0.04 * V ** 2 + 5 * V + 140 + I
+
+
+def unullcline(V, b):
+    return b * V
+
+
+def U_vec(X, Y, I):
+    return (np.full(X.shape, 0.04) * X * X + np.full(X.shape, 5) * X)+ np.full(X.shape, 140) - Y + np.full(X.shape, I)
+
+
+def V_vec(X, Y, a, b):
+    return np.full(X.shape, a) * (np.full(X.shape, b) * X - Y)
+
+
+def normalize(U, V):
+    norm = np.hypot(U, V)
+    return U / norm, V / norm
+
+
+def field(X, Y, U, V, I, a, b):  # U_vec and V_vec written into U and V
+    np.multiply(X, 0.04, out=U)
+    U += 5
+    U *= X
+    U += 140 + I
+    U -= Y
+    np.multiply(X, b, out=V)
+    V -= Y
+    V *= a
@@ -0,0 +1,82 @@
+import numpy as np
+
+"""
+5.2.4  dns https://www.izhikevich.org/publications/
+
+Model:
+dV/dt  = I + V^2 - u
+du/dt = a(bV - u)
+
+if v ≥ 1, then
+v <- c, u <- u + d
+
+V approximation of membrane potential
+u recovery variable slow outward currents
+I injected current
+a, b recovery dynamics
+c reset v value
+d update recovery value u
+
+for multiple recovery variables: 
+a b d and w become vectors
+dV/dt = I + v^2 - sum(u)
+
+Nullclides:
+u = V^2 + I
+u = b*V
+"""
+
+
+class Sim:
+    def __init__(self, a, b, c, d, I):
+        self.Vsim = 0
+        self.usim = 0
+        self.a = a
+        self.b = b
+        self.c = c
+        self.d = d
+        self.I = I
+
+    def updatevar(self, a, b, c, d, I):
+        self.a = a
+        self.b = b
+        self.c = c
+        self.d = d
+        self.I = I
+
+    def step(self):
+        spike = 0
+        self.Vsim = self.Vsim + (self.I + self.Vsim ** 2 + self.usim)
+        self.usim = self.usim + self.a * (self.b * self.Vsim - self.usim)
+        if self.Vsim > 1:
+            spike = 1
+            self.Vsim = self.c
+            self.usim = self.usim + self.d
+
+        return self.Vsim, self.usim, spike
+
+
+
+def Vnullcline(V, I):
+    return V ** 2 + I
+
+
+def unullcline(V, b):
+    return b * V
+
+
+def U_vec(X, Y, I):
+    return np.full(X.shape, I) + X ** 2 - Y
+
+
+def V_vec(X, Y, a, b):
+    return np.full(X.shape, a) * (np.full(X.shape, b) * X - Y)
+
+
+def field(X, Y, U, V, I, a, b):  # U_vec and V_vec written into U and V
+    np.multiply(X, X, out=U)
+    U += I
+    U -= Y
+    np.multiply(X, b, out=V)
+    V -= Y
+    V *= a
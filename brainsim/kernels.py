@@ -0,0 +1,164 @@
+import time
+try:
+    import numba
+except ImportError:
+    numba = None
+
+"""
+Fused step kernels for the neuron models, compiled with Numba when it is installed
+
+The NumPy step of a population makes one pass over memory per operation and keeps temporaries for the V update, the
+u update and the reset masks. Each kernel here does the whole split step of one neuron (V from the old u, u from the
+new V, threshold test, reset) in registers, in one loop parallelised over the neurons with prange. The arithmetic
+follows the NumPy path operation by operation, so the results are the same up to the order of the I_ext addition.
+
+available is False without Numba and every kernel is None; the populations and Neurons then keep their NumPy step,
+so backend="numba" is always safe to ask for. I_ext is an array of length n or of length 0 for no external input.
+The izhikevich kernel tests v > Vpeak as IzhikevichPopulation does, a NaN after a blow up is no spike.
+The first call of each kernel compiles it (cached on disk in __pycache__), benchmark() excludes that call.
+"""
+
+available = numba is not None
+prange = numba.prange if available else range
+
+
+def _jit(fn):
+    return numba.njit(parallel=True, cache=True)(fn) if available else None
+
+
+@_jit
+def izhikevich(V, u, I_ext, dt, Vr, Vt, k, C, I, a, b, Vpeak, c, d, V_out, u_out, spike):
+    for i in prange(V.size):
+        v, w = V[i], u[i]
+        t = (v - Vr[i]) * k[i] * (v - Vt[i]) - w + I[i]
+        if I_ext.size:
+            t += I_ext[i]
+        v += dt * (t / C[i])
+        w += dt * (((v - Vr[i]) * b[i] - w) * a[i])
+        u_out[i] = w
+        if v > Vpeak[i]:  # np.greater of IzhikevichPopulation, NaN is no spike
+            spike[i] = True
+            V_out[i] = Vpeak[i]
+            v = c[i]
+            w += d[i]
+        else:
+            spike[i] = False
+            V_out[i] = v
+        V[i], u[i] = v, w
+
+
+@_jit
+def izhikevich_simple(V, u, I_ext, dt, I, a, b, Vpeak, c, d, V_out, u_out, spike):
+    for i in prange(V.size):
+        v, w = V[i], u[i]
+        t = v * v + I[i] - w
+        if I_ext.size:
+            t += I_ext[i]
+        v += dt * t
+        w += dt * ((v * b[i] - w) * a[i])
+        u_out[i] = w
+        if not v <= Vpeak[i]:
+            spike[i] = True
+            V_out[i] = Vpeak[i]
+            v = c[i]
+            w += d[i]
+        else:
+            spike[i] = False
+            V_out[i] = v
+        V[i], u[i] = v, w
+
+
+@_jit
+def izhikevich2003(V, u, I_ext, dt, I, a, b, Vpeak, c, d, V_out, u_out, spike):
+    for i in prange(V.size):
+        v, w = V[i], u[i]
+        t = (v * 0.04 + 5) * v + (140 + I[i]) - w
+        if I_ext.size:
+            t += I_ext[i]
+        v += dt * t
+        w += dt * ((v * b[i] - w) * a[i])
+        u_out[i] = w
+        if not v <= Vpeak[i]:
+            spike[i] = True
+            V_out[i] = Vpeak[i]
+            v = c[i]
+            w += d[i]
+        else:
+            spike[i] = False
+            V_out[i] = v
+        V[i], u[i] = v, w
+
+
+@_jit
+def fitzhugh_nagumo(V, u, I_ext, dt, a, b, c, I, V_out, u_out, spike):
+    for i in prange(V.size):
+        v, w = V[i], u[i]
+        t = (a[i] - v) * v * (v - 1) - w + I[i]
+        if I_ext.size:
+            t += I_ext[i]
+        v += dt * t
+        w += dt * (b[i] * v - c[i] * w)
+        V_out[i], u_out[i] = v, w
+        V[i], u[i] = v, w
+
+
+@_jit
+def izhikevich2003_population(V, u, I_ext, dt, I, a, b, c, d, Vpeak, V_out, u_out, spike):
+    # Izhikevich2003Population.step, u, a, b, d of shape (m, n)
+    m = u.shape[0]
+    for i in prange(V.size):
+        v = V[i]
+        s = 0.0
+        for j in range(m):
+            s += u[j, i]
+        t = v * v * 0.04 + v * 5 + 140 - s + I[i]
+        if I_ext.size:
+            t += I_ext[i]
+        v += t * dt
+        fired = v > Vpeak[i]
+        for j in range(m):
+            w = u[j, i] + (b[j, i] * v - u[j, i]) * a[j, i] * dt
+            u_out[j, i] = w
+            if fired:
+                w += d[j, i]
+            u[j, i] = w
+        spike[i] = fired
+        if fired:
+            V_out[i] = Vpeak[i]
+            V[i] = c[i]
+        else:
+            V_out[i] = v
+            V[i] = v
+
+
+kernels = {"izhikevich": izhikevich, "izhikevich_simple": izhikevich_simple, "izhikevich2003": izhikevich2003,
+           "fitzhugh_nagumo": fitzhugh_nagumo}
+
+def benchmark(sizes=(10 ** 3, 10 ** 5, 10 ** 7), budget=10 ** 8):
+    # {(model, n): (numpy, numba)} neuron-steps/second of Neurons.step, numba None without Numba
+    from .integrators import Neurons
+    results = {}
+    for model in kernels:
+        for n in sizes:
+            steps = max(5, min(2000, budget // n))
+            rates = []
+            for backend in ("numpy", "numba"):
+                if backend == "numba" and not available:
+                    rates.append(None)
+                    continue
+                neurons = Neurons(model, n, V0=-65.0 if model == "izhikevich2003" else 0.0, backend=backend)
+                neurons.step()  # warm-up, compiles the kernel
+                start = time.perf_counter()
+                for _ in range(steps):
+                    neurons.step()
+                rates.append(n * steps / (time.perf_counter() - start))
+            results[model, n] = tuple(rates)
+    return results
+
+
+if __name__ == "__main__":
+    print("numba", numba.__version__ if available else "not installed", "threads",
+          numba.get_num_threads() if available else 1)
+    for (model, n), (np_rate, nb_rate) in benchmark().items():
+        speedup = f"{nb_rate:.3e} neuron-steps/s  x{nb_rate / np_rate:.1f}" if nb_rate else "-"
+        print(f"{model:>17} n={n:<9} numpy {np_rate:.3e} neuron-steps/s  numba {speedup}")
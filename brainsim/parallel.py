@@ -0,0 +1,249 @@
+import os
+import time
+import json
+import traceback
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy
+from .grey_white_matter import GreyMatter, WhiteMatter, scale_brain
+from .synapses import compile_projections
+from .topology import Topology
+from .partition import partition_chunks
+
+"""
+Multi-process execution of WhiteMatter
+
+Chunks are assigned to worker processes, by default with partition.partition_chunks. Every worker builds and keeps
+the GreyMatter state of its own chunks and the projections that target them, nothing but spikes crosses process
+boundaries. Spikes are published in one multiprocessing.shared_memory bitmap of shape (2, window, total neurons),
+one byte per neuron and step: during a window of W steps each worker writes the spikes of its exported chunks into
+buffer w % 2, then all workers meet at a barrier and scatter the remote spikes of the window into their delay ring
+buffers.
+
+W defaults to the smallest inter-chunk delay, so a spike emitted inside a window is never due before the next window
+starts. With the double buffer one barrier per window is enough: buffer w % 2 is only rewritten after the barrier of
+window w + 1, which every worker reaches only once it has finished reading it.
+Given the same seed the result is identical to WhiteMatter.step_all().
+"""
+
+
+class _Worker:
+    def __init__(self, brain_data, chunk_ids, bitmap, barrier, window, dt, noise, fan_in, local_delay, remote_delay,
+                 entropy):
+        chunks = brain_data['chunks']
+        local = set(chunk_ids)
+        seeds = numpy.random.SeedSequence(entropy).spawn(len(chunks) + 1)
+        topology = Topology(brain_data)
+        projections = compile_projections(brain_data, fan_in=fan_in, local_delay=local_delay,
+                                          remote_delay=remote_delay, seed=seeds[-1], targets=local, topology=topology)
+        max_delay = max([proj.delay for proj in projections], default=1)
+        sizes = [sum(layer['size'] for layer in chunk['layers']) for chunk in chunks]
+        self.offsets = numpy.cumsum([0] + sizes)
+        self.layer_bounds = {}  # layer boundaries (chunk local) of every remote chunk read by this worker
+        self.regions = {ci: GreyMatter(chunks[ci]['name'], chunks[ci]['id'], chunks[ci]['layers'], dt, noise,
+                                       seeds[ci], max_delay) for ci in sorted(local)}
+        self.local_out = {ci: [] for ci in self.regions}  # projections between chunks of this worker, by source
+        self.remote_in = {}  # projections from chunks of other workers, by source
+        for proj in projections:
+            src_ci = proj.source[0]
+            if src_ci in local:
+                self.local_out[src_ci].append(proj)
+            else:
+                self.remote_in.setdefault(src_ci, []).append(proj)
+                if src_ci not in self.layer_bounds:
+                    self.layer_bounds[src_ci] = numpy.cumsum([0] + [layer['size'] for layer in chunks[src_ci]['layers']])
+        # local chunks with an edge to a chunk of another worker, their spikes go into the bitmap
+        is_local = numpy.zeros(topology.n_chunks, dtype=bool)
+        is_local[list(local)] = True
+        remote_edges = ~is_local[topology.out_dst]
+        self.exported = [ci for ci in sorted(local)
+                         if remote_edges[topology.out_offsets[ci]:topology.out_offsets[ci + 1]].any()]
+        self.spike_counts = {ci: 0 for ci in self.regions}
+        self.bitmap = bitmap
+        self.barrier = barrier
+        self.window = window
+        self.t = 0
+        self.windows = 0
+
+    def run(self, steps):
+        done = 0
+        while done < steps:
+            w = min(self.window, steps - done)
+            buf = self.bitmap[self.windows % 2]
+            for s in range(w):
+                for ci, region in self.regions.items():
+                    region.step()
+                    self.spike_counts[ci] += region.spiking.size
+                for ci in self.exported:
+                    buf[s, self.offsets[ci]:self.offsets[ci + 1]] = self.regions[ci].population.spike
+                self._deliver_local(self.t + s)
+            self.barrier.wait()
+            self._deliver_remote(buf, w)
+            self.t += w
+            self.windows += 1
+            done += w
+
+    def _deliver_local(self, t):
+        for ci, outgoing in self.local_out.items():
+            region = self.regions[ci]
+            if region.spiking.size == 0:
+                continue
+            for proj in outgoing:
+                target = self.regions[proj.target[0]].layers[proj.target[1]]
+                proj.propagate(region.layer_spiking[proj.source[1]],
+                               target.pending[(t + proj.delay) % target.pending.shape[0]])
+
+    def _deliver_remote(self, buf, w):
+        for src_ci, incoming in self.remote_in.items():
+            bounds = self.layer_bounds[src_ci]
+            block = buf[:w, self.offsets[src_ci]:self.offsets[src_ci + 1]]
+            for s in range(w):
+                spiking = numpy.flatnonzero(block[s])
+                if spiking.size == 0:
+                    continue
+                cuts = spiking.searchsorted(bounds)
+                for proj in incoming:
+                    lj = proj.source[1]
+                    target = self.regions[proj.target[0]].layers[proj.target[1]]
+                    proj.propagate(spiking[cuts[lj]:cuts[lj + 1]] - bounds[lj],
+                                   target.pending[(self.t + s + proj.delay) % target.pending.shape[0]])
+
+    def stats(self):
+        return {ci: (region.iteration, self.spike_counts[ci]) for ci, region in self.regions.items()}
+
+
+def _worker_main(brain_data, chunk_ids, shm_name, shape, barrier, conn, options):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    bitmap = numpy.ndarray(shape, dtype=numpy.bool_, buffer=shm.buf)
+    try:
+        worker = _Worker(brain_data, chunk_ids, bitmap, barrier, **options)
+        conn.send(('ready', None))
+        while True:
+            cmd, arg = conn.recv()
+            if cmd == 'close':
+                break
+            worker.run(arg)
+            conn.send(('ok', worker.stats()))
+    except Exception:
+        barrier.abort()  # release the other workers instead of leaving them at the barrier
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        del bitmap
+        shm.close()
+
+
+class ParallelWhiteMatter:  # WhiteMatter with its chunks split over worker processes
+    def __init__(self, json_brainfile, workers=None, assignment=None, window=None, dt=0.5, noise=5.0, fan_in=32,
+                 local_delay=1, remote_delay=4, seed=None):
+        if isinstance(json_brainfile, dict):
+            self.brain_data = json_brainfile
+        else:
+            with open(json_brainfile) as bf:
+                self.brain_data = json.load(bf)
+        chunks = self.brain_data['chunks']
+        sizes = [sum(layer['size'] for layer in chunk['layers']) for chunk in chunks]
+        if assignment is None:
+            workers = min(workers or os.cpu_count() or 1, max(len(chunks), 1))
+            assignment = partition_chunks(self.brain_data, workers, fan_in=fan_in)
+        else:
+            workers = max(assignment, default=0) + 1
+        if window is None:
+            window = remote_delay
+        if window > remote_delay:
+            raise ValueError("window must not exceed the inter-chunk delay")
+        self.assignment = list(assignment)
+        self.workers = workers
+        self.window = window
+        self.sizes = sizes
+        self.iteration = 0
+        self.spike_counts = numpy.zeros(len(chunks), dtype=numpy.int64)
+        shape = (2, window, sum(sizes))
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, int(numpy.prod(shape))))
+        ctx = mp.get_context()
+        barrier = ctx.Barrier(workers)
+        options = dict(window=window, dt=dt, noise=noise, fan_in=fan_in, local_delay=local_delay,
+                       remote_delay=remote_delay, entropy=numpy.random.SeedSequence(seed).entropy)
+        self.conns = []
+        self.processes = []
+        for rank in range(workers):
+            chunk_ids = [ci for ci, worker in enumerate(self.assignment) if worker == rank]
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(target=_worker_main, daemon=True,
+                                  args=(self.brain_data, chunk_ids, self.shm.name, shape, barrier, child_conn, options))
+            process.start()
+            self.conns.append(parent_conn)
+            self.processes.append(process)
+        self._gather()
+
+    def _gather(self):
+        results = [conn.recv() for conn in self.conns]
+        errors = [arg for status, arg in results if status == 'error']
+        if errors:
+            self.close()
+            raise RuntimeError("worker failed:\n" + errors[0])
+        return [arg for _, arg in results]
+
+    def run(self, steps):
+        for conn in self.conns:
+            conn.send(('run', steps))
+        for stats in self._gather():
+            for ci, (iteration, spikes) in stats.items():
+                self.spike_counts[ci] = spikes
+        self.iteration += steps
+
+    def step_all(self):
+        self.run(1)
+
+    def close(self):
+        for conn, process in zip(self.conns, self.processes):
+            if process.is_alive():
+                try:
+                    conn.send(('close', None))
+                except (BrokenPipeError, OSError):
+                    pass
+        for process in self.processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        self.conns = []
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def benchmark_scaling(brain_data, copies=(1, 10, 100), workers=(1, 2, 4, 8, 16, 32), steps=200):
+    # steps/second of the serial WhiteMatter and of ParallelWhiteMatter for growing brains and worker counts
+    results = []
+    for n in copies:
+        data = scale_brain(brain_data, copies=n)
+        brain = WhiteMatter(data, seed=0)
+        start = time.perf_counter()
+        for _ in range(steps):
+            brain.step_all()
+        results.append((n, 0, steps / (time.perf_counter() - start)))
+        for k in workers:
+            if k > len(data['chunks']):
+                continue
+            with ParallelWhiteMatter(data, workers=k, seed=0) as pbrain:
+                pbrain.run(pbrain.window)  # warm-up
+                start = time.perf_counter()
+                pbrain.run(steps)
+                results.append((n, k, steps / (time.perf_counter() - start)))
+    return results
+
+
+if __name__ == "__main__":
+    with open("brain-data.json") as bf:
+        sample = json.load(bf)
+    cpus = os.cpu_count() or 1
+    counts = [k for k in (1, 2, 4, 8, 16, 32) if k <= cpus]
+    for n, k, steps_s in benchmark_scaling(sample, workers=counts):
+        print(f"{n:>5}x brain  {'serial' if k == 0 else f'{k} workers':>10}: {steps_s:10.1f} steps/s")
@@ -0,0 +1,137 @@
+import json
+import numpy
+from collections import deque
+from .synapses import resolve_inputs
+
+"""
+Connectome partitioning for the parallel runner
+
+The chunk graph is weighted by neurons per chunk (node weight) and by the estimated number of synapses between two
+chunks (edge weight): every projection contributes target layer size * fan-in, with fan-in capped by the source layer
+size as in synapses.compile_projections. Edges are taken as undirected since spikes cross a cut in either direction.
+
+partition_chunks splits the chunks into k parts of about equal neuron count while keeping the cut small:
+1. order the chunks breadth first so connected chunks are neighbours, cut the order into k slices of equal weight
+2. greedy refinement: move a chunk to the part it is most connected to while the gain is positive, the part stays
+   under the load limit (imbalance * total / k, or the largest chunk when that alone is larger) and no part empties
+With k at least the number of chunks every chunk gets a part of its own.
+The result is a list chunk index -> part, as taken by ParallelWhiteMatter(assignment=...).
+"""
+
+
+def chunk_graph(brain_data, fan_in=32, topology=None):
+    # node weights and undirected adjacency {chunk: {chunk: synapses}}, the inputs resolved on the Topology arrays
+    chunks = brain_data['chunks']
+    sizes = [sum(layer['size'] for layer in chunk['layers']) for chunk in chunks]
+    adj = [{} for _ in chunks]
+    for src_ci, src_lj, ci, lj, _ in resolve_inputs(brain_data, topology):
+        if src_ci == ci:
+            continue
+        synapses = chunks[ci]['layers'][lj]['size'] * min(fan_in, chunks[src_ci]['layers'][src_lj]['size'])
+        adj[ci][src_ci] = adj[ci].get(src_ci, 0) + synapses
+        adj[src_ci][ci] = adj[src_ci].get(ci, 0) + synapses
+    return sizes, adj
+
+
+def _bfs_order(adj):
+    visited = [False] * len(adj)
+    order = []
+    for start in sorted(range(len(adj)), key=lambda ci: len(adj[ci])):  # start from the periphery
+        if visited[start]:
+            continue
+        visited[start] = True
+        queue = deque([start])
+        while queue:
+            ci = queue.popleft()
+            order.append(ci)
+            for nb in adj[ci]:
+                if not visited[nb]:
+                    visited[nb] = True
+                    queue.append(nb)
+    return order
+
+
+def partition_chunks(brain_data, k, fan_in=32, imbalance=1.05, passes=10, graph=None):
+    sizes, adj = graph if graph is not None else chunk_graph(brain_data, fan_in)
+    n = len(sizes)
+    if k >= n:  # one chunk per part
+        return list(range(n))
+    k = max(1, k)
+    total = sum(sizes)
+    part = [0] * n
+    load = [0] * k
+    count = [0] * k  # chunks per part, a move never empties a part
+    before = 0
+    for ci in _bfs_order(adj):
+        part[ci] = min(k - 1, int((before + sizes[ci] / 2) * k / total)) if total else ci % k
+        load[part[ci]] += sizes[ci]
+        count[part[ci]] += 1
+        before += sizes[ci]
+    for q in range(k):  # a large chunk can make the slicing skip a part, give it the last chunk of a crowded part
+        if not count[q]:
+            ci = max((ci for ci in range(n) if count[part[ci]] > 1), key=lambda ci: (count[part[ci]], ci))
+            load[part[ci]] -= sizes[ci]
+            count[part[ci]] -= 1
+            part[ci] = q
+            load[q] += sizes[ci]
+            count[q] += 1
+    # a part only goes over the limit when a single chunk is larger than the limit by itself
+    max_load = max(imbalance * total / k, max(sizes, default=0))
+    for _ in range(passes):
+        moved = 0
+        for ci in range(n):
+            p = part[ci]
+            conn = {}
+            for nb, w in adj[ci].items():
+                conn[part[nb]] = conn.get(part[nb], 0) + w
+            internal = conn.get(p, 0)
+            best, best_gain = p, 0
+            for q, w in conn.items():
+                gain = w - internal
+                if q != p and gain > best_gain and load[q] + sizes[ci] <= max_load and count[p] > 1:
+                    best, best_gain = q, gain
+            if best != p:
+                part[ci] = best
+                load[p] -= sizes[ci]
+                load[best] += sizes[ci]
+                count[p] -= 1
+                count[best] += 1
+                moved += 1
+        if not moved:
+            break
+    return part
+
+
+def partition_report(brain_data, assignment, fan_in=32, graph=None):  # per part load and the synapses cut
+    sizes, adj = graph if graph is not None else chunk_graph(brain_data, fan_in)
+    k = max(assignment, default=0) + 1
+    load = numpy.zeros(k, dtype=numpy.int64)
+    numpy.add.at(load, assignment, sizes)
+    cut = cut_edges = total = 0
+    for ci, neighbours in enumerate(adj):
+        for nb, w in neighbours.items():
+            if nb < ci:
+                continue
+            total += w
+            if assignment[ci] != assignment[nb]:
+                cut += w
+                cut_edges += 1
+    return {'parts': k,
+            'load': load.tolist(),
+            'imbalance': float(load.max() * k / load.sum()) if load.sum() else 1.0,
+            'cut_synapses': int(cut),
+            'cut_edges': cut_edges,
+            'total_synapses': int(total),
+            'cut_fraction': cut / total if total else 0.0}
+
+
+if __name__ == "__main__":
+    from .grey_white_matter import scale_brain
+    with open("brain-data.json") as bf:
+        sample = json.load(bf)
+    data = scale_brain(sample, copies=100)
+    graph = chunk_graph(data)
+    for k in (1, 2, 4, 8, 16, 32):
+        report = partition_report(data, partition_chunks(data, k, graph=graph), graph=graph)
+        print(f"k={k:>2}  max load {max(report['load']):>6}  imbalance {report['imbalance']:.3f}  "
+              f"cut {report['cut_synapses']:>8} synapses ({report['cut_fraction']:.1%}, {report['cut_edges']} edges)")
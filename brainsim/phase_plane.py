@@ -0,0 +1,120 @@
+import numpy as np
+
+"""
+Phase plane of the interactive explorers, updated in place
+
+PhasePlane draws the quiver and the nullclines once and keeps the field in preallocated arrays. The explorer gives
+a compute(U, V) callback that writes the field for the current slider values into U and V (the in place field()
+of the model modules) and returns the nullcline values on v. After a slider change request() only marks the plane
+as stale: a single shot timer recomputes it once with the latest values, updates the artists with set_UVC/set_ydata
+and asks for one redraw. A burst of slider events while dragging costs one recomputation.
+
+The quiver keeps the scale of its first draw, so the field is either normalized to unit arrows (normalize=True) or
+divided by its mean arrow length, which is what the autoscale of a new quiver did for every update before.
+The artists exist from the start, call flush() once the sliders compute() reads are set up.
+"""
+
+
+class PhasePlane:  # quiver and nullclines of ax (nullclines mirrored on the mirror axes)
+    def __init__(self, ax, X, Y, v, compute, nullclines=2, normalize=False, mirror=None, interval=30):
+        self.ax = ax
+        self.X, self.Y = X, Y
+        self.v = v
+        self.compute = compute
+        self.normalize = normalize
+        self.U = np.ones(X.shape)  # unit arrows until the first flush, an early draw then picks the same scale
+        self.V = np.zeros(X.shape)
+        self._norm = np.zeros(X.shape)
+        self.quiver = ax.quiver(X, Y, self.U, self.V)
+        self.lines = [ax.plot(v, np.zeros_like(v), lw=2)[0] for _ in range(nullclines)]
+        if mirror is not None:
+            self.lines += [mirror.plot(v, np.zeros_like(v), lw=2)[0] for _ in range(nullclines)]
+        self.pending = False
+        self.updates = 0
+        self.timer = ax.figure.canvas.new_timer(interval=interval)
+        self.timer.single_shot = True
+        self.timer.add_callback(self.flush)
+
+    def _compute(self):
+        nullclines = self.compute(self.U, self.V)
+        np.hypot(self.U, self.V, out=self._norm)
+        if self.normalize:
+            np.divide(self.U, self._norm, out=self.U, where=self._norm > 0)
+            np.divide(self.V, self._norm, out=self.V, where=self._norm > 0)
+        else:
+            mean = self._norm.mean()
+            if mean > 0:
+                self.U /= mean
+                self.V /= mean
+        return nullclines
+
+    def request(self, val=None):  # slider callback, coalesced into one flush
+        if not self.pending:
+            self.pending = True
+            self.timer.start()
+
+    def flush(self):
+        self.pending = False
+        nullclines = self._compute()
+        self.quiver.set_UVC(self.U, self.V)
+        for line, n in zip(self.lines, nullclines * (len(self.lines) // len(nullclines))):
+            line.set_ydata(n)
+        self.updates += 1
+        self.ax.figure.canvas.draw_idle()
+
+
+def benchmark(grid=(27, 10), updates=20):  # seconds per slider update, clear and replot vs PhasePlane, Agg backend
+    import time
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from .izhikevich import Vnullcline, unullcline, U_vec, V_vec, normalize, field
+    v = np.linspace(-500, 500, 2000)
+    X, Y = np.meshgrid(np.linspace(-200, 120, grid[0]), np.linspace(-500, 1000, grid[1]))
+    results = {}
+    fig, ax1 = plt.subplots()
+    start = time.perf_counter()
+    for n in range(updates):
+        I = float(n)
+        ax1.clear()
+        ax1.plot(v, Vnullcline(v, -60, -40, 0.7, I), lw=2)
+        ax1.plot(v, unullcline(v, -60, -2), lw=2)
+        U, V = normalize(U_vec(X, Y, -40, -60, 0.7, 100, I), V_vec(X, Y, 0.03, -2, -60))
+        ax1.quiver(X, Y, U, V)
+        ax1.set_xlim((-200, 120))
+        ax1.set_ylim((-500, 1000))
+        fig.canvas.draw()
+    results['replot'] = (time.perf_counter() - start) / updates
+    plt.close(fig)
+    fig, ax1 = plt.subplots()
+    params = {'I': 0.0}
+
+    def compute(U, V):
+        field(X, Y, U, V, -60, -40, 0.7, 100, params['I'], 0.03, -2)
+        return Vnullcline(v, -60, -40, 0.7, params['I']), unullcline(v, -60, -2)
+
+    phase = PhasePlane(ax1, X, Y, v, compute, normalize=True)
+    ax1.set_xlim((-200, 120))
+    ax1.set_ylim((-500, 1000))
+    phase.flush()
+    start = time.perf_counter()
+    for n in range(updates):
+        params['I'] = float(n)
+        phase.flush()  # draw_idle() of Agg draws at once
+    results['in_place'] = (time.perf_counter() - start) / updates
+    start = time.perf_counter()
+    for n in range(updates):  # one drag: many slider events, one flush
+        params['I'] = float(n)
+        phase.request()
+    phase.timer.stop()
+    phase.flush()
+    results['coalesced_drag'] = time.perf_counter() - start
+    plt.close(fig)
+    return results
+
+
+if __name__ == "__main__":
+    for grid in ((27, 10), (100, 100), (200, 200)):
+        r = benchmark(grid)
+        print(f"{grid[0]}x{grid[1]} grid: replot {r['replot'] * 1e3:7.1f} ms/update  in place {r['in_place'] * 1e3:7.1f} "
+              f"ms/update  20 coalesced events {r['coalesced_drag'] * 1e3:7.1f} ms")
@@ -0,0 +1,232 @@
+import time
+import numpy as np
+
+"""
+Vectorized neuron populations, one batched update per step for all neurons
+
+Izhikevich 2007 model (same as izhikevich.Sim, dt = 1):
+dV/dt  = (k*(V - Vr)*(V - Vt) - u + I)/C
+du/dt = a*(b*(V - Vr) - u)
+
+if V > Vpeak, then
+V <- c, u <- u + d
+
+State (V, u) and every per neuron parameter live in contiguous float64 arrays of length n,
+scalars passed to the constructor are broadcast to all neurons.
+
+Izhikevich 2003 model (same as izhikevich2003.Sim) with m recovery variables:
+dV/dt = 0.04*V^2 + 5*V + 140 - sum(u) + I
+du_j/dt = a_j*(b_j*V - u_j)
+
+if V > Vpeak, then
+V <- c, u_j <- u_j + d_j
+
+a, b, d and u have shape (m, n), unused recovery variables are padded with a = b = d = 0.
+
+Both classes take backend="numba" for the fused compiled step of brainsim.kernels, without Numba it stays NumPy, or
+backend="torch" for the torch.compile step of brainsim.torch_backend.
+"""
+
+
+def _kernel(backend, name):
+    # the fused step of backend "numba" (if Numba is installed) or "torch", None for the NumPy step
+    if backend not in ("numpy", "numba", "torch"):
+        raise ValueError(f"unknown backend {backend!r}")
+    if backend == "numpy":
+        return None
+    if backend == "torch":
+        from . import torch_backend
+        return getattr(torch_backend, name)
+    from . import kernels
+    return getattr(kernels, name) if kernels.available else None
+
+
+_no_input = np.zeros(0)
+
+
+def _input(I_ext, n):  # I_ext as the kernels take it
+    if I_ext is None:
+        return _no_input
+    I_ext = np.asarray(I_ext, dtype=np.float64)
+    return np.ascontiguousarray(I_ext) if I_ext.shape == (n,) else np.full(n, I_ext)
+
+
+class IzhikevichPopulation:
+    params = ("Vr", "Vt", "Vpeak", "a", "b", "c", "d", "k", "I", "C")
+
+    def __init__(self, n, Vr, Vt, Vpeak, a, b, c, d, k, I, C, V0=0.0, u0=0.0, backend="numpy"):
+        self.n = n
+        self.V = np.full(n, V0, dtype=np.float64)
+        self.u = np.full(n, u0, dtype=np.float64)
+        self.spike = np.zeros(n, dtype=bool)
+        self.V_out = np.zeros(n, dtype=np.float64)  # V with Vpeak padding for the spiking neurons
+        self.u_out = np.zeros(n, dtype=np.float64)  # u before the d update
+        self._tmp = np.empty(n, dtype=np.float64)
+        self._tmp2 = np.empty(n, dtype=np.float64)
+        for name in self.params:
+            setattr(self, name, np.empty(n, dtype=np.float64))
+        self.updatevar(Vr, Vt, Vpeak, a, b, c, d, k, I, C)
+        self._kernel = _kernel(backend, "izhikevich")
+
+    def updatevar(self, Vr, Vt, Vpeak, a, b, c, d, k, I, C):  # scalars or arrays of length n, copied in place
+        for name, val in zip(self.params, (Vr, Vt, Vpeak, a, b, c, d, k, I, C)):
+            getattr(self, name)[:] = val
+
+    def step(self, I_ext=None):
+        if self._kernel is not None:
+            self._kernel(self.V, self.u, _input(I_ext, self.n), 1.0, self.Vr, self.Vt, self.k, self.C, self.I, self.a,
+                         self.b, self.Vpeak, self.c, self.d, self.V_out, self.u_out, self.spike)
+            return self.V_out, self.u_out, self.spike
+        V, u, t, t2 = self.V, self.u, self._tmp, self._tmp2
+        # V += (k*(V - Vr)*(V - Vt) - u + I)/C
+        np.subtract(V, self.Vr, out=t)
+        np.subtract(V, self.Vt, out=t2)
+        t *= self.k
+        t *= t2
+        t -= u
+        t += self.I
+        if I_ext is not None:
+            t += I_ext
+        t /= self.C
+        V += t
+        # u += a*(b*(V - Vr) - u)
+        np.subtract(V, self.Vr, out=t)
+        t *= self.b
+        t -= u
+        t *= self.a
+        u += t
+        spike = np.greater(V, self.Vpeak, out=self.spike)
+        np.copyto(self.V_out, V)
+        np.copyto(self.V_out, self.Vpeak, where=spike)  # padding for consistent spikes
+        np.copyto(self.u_out, u)
+        np.copyto(V, self.c, where=spike)
+        np.add(u, self.d, out=u, where=spike)
+        return self.V_out, self.u_out, spike
+
+
+class Izhikevich2003Population:
+    def __init__(self, n, a, b, c, d, I=0.0, Vpeak=30, dt=0.2, m=1, V0=-65.0, u0=None, backend="numpy"):
+        self.n = n
+        self.m = m
+        self.dt = dt
+        self.a = np.empty((m, n), dtype=np.float64)
+        self.b = np.empty((m, n), dtype=np.float64)
+        self.d = np.empty((m, n), dtype=np.float64)
+        self.c = np.empty(n, dtype=np.float64)
+        self.I = np.empty(n, dtype=np.float64)
+        self.Vpeak = np.empty(n, dtype=np.float64)
+        self.updatevar(a, b, c, d, I, Vpeak)
+        self.V = np.full(n, V0, dtype=np.float64)
+        self.u = self.b * self.V if u0 is None else np.array(np.broadcast_to(u0, (m, n)), dtype=np.float64)
+        self.spike = np.zeros(n, dtype=bool)
+        self.V_out = np.zeros(n, dtype=np.float64)
+        self.u_out = np.zeros((m, n), dtype=np.float64)
+        self._tmp = np.empty(n, dtype=np.float64)
+        self._tmp2 = np.empty(n, dtype=np.float64)
+        self._utmp = np.empty((m, n), dtype=np.float64)
+        self._kernel = _kernel(backend, "izhikevich2003_population")
+
+    def updatevar(self, a, b, c, d, I, Vpeak=30):  # a, b, d broadcast to (m, n), c, I, Vpeak to (n,)
+        self.a[:] = a
+        self.b[:] = b
+        self.d[:] = d
+        self.c[:] = c
+        self.I[:] = I
+        self.Vpeak[:] = Vpeak
+
+    def step(self, I_ext=None):
+        if self._kernel is not None:
+            self._kernel(self.V, self.u, _input(I_ext, self.n), self.dt, self.I, self.a, self.b, self.c, self.d,
+                         self.Vpeak, self.V_out, self.u_out, self.spike)
+            return self.V_out, self.u_out, self.spike
+        V, u, t, t2, ut = self.V, self.u, self._tmp, self._tmp2, self._utmp
+        # V += dt*(0.04*V^2 + 5*V + 140 - sum(u) + I)
+        np.multiply(V, V, out=t)
+        t *= 0.04
+        np.multiply(V, 5, out=t2)
+        t += t2
+        t += 140
+        if self.m == 1:
+            t -= u[0]
+        else:
+            t -= u.sum(axis=0, out=t2)
+        t += self.I
+        if I_ext is not None:
+            t += I_ext
+        t *= self.dt
+        V += t
+        # u += dt*a*(b*V - u)
+        np.multiply(self.b, V, out=ut)
+        ut -= u
+        ut *= self.a
+        ut *= self.dt
+        u += ut
+        spike = np.greater(V, self.Vpeak, out=self.spike)
+        np.copyto(self.V_out, V)
+        np.copyto(self.V_out, self.Vpeak, where=spike)
+        np.copyto(self.u_out, u)
+        np.copyto(V, self.c, where=spike)
+        np.add(u, self.d, out=u, where=spike)
+        return self.V_out, self.u_out, spike
+
+    def run(self, steps, record_every=1):
+        # steps without external input, returns the V trace (Vpeak padded) of every record_every-th step and the
+        # (step, neuron) pairs of all spikes. One recovery variable only: the update is folded to 11 array ops
+        # per step on dt*u, so small populations (the 20 regimes) are not dominated by per call overhead
+        if self.m != 1:
+            raise ValueError("run() needs a single recovery variable, use step()")
+        n, dt = self.n, self.dt
+        V = self.V
+        U = self.u[0] * dt
+        c04, c1, K = 0.04 * dt, 1 + 5 * dt, dt * (140 + self.I)
+        A1 = 1 - dt * self.a[0]
+        AB = dt * dt * self.a[0] * self.b[0]
+        Vpeak, c, dtd = self.Vpeak, self.c, dt * self.d[0]
+        trace = np.empty((steps // record_every, n))
+        rows = list(trace)
+        spike = np.empty(n, dtype=bool)
+        t, s = self._tmp, self._tmp2
+        spike_steps, spike_idx = [], []
+        mul, sub, gt = np.multiply, np.subtract, np.greater
+        for i in range(steps):
+            # V += dt*(0.04*V^2 + 5*V + 140 - u + I)  ->  V = V*(0.04*dt*V + 1 + 5*dt) + dt*(140 + I) - dt*u
+            mul(V, c04, t)
+            t += c1
+            t *= V
+            t += K
+            sub(t, U, V)
+            # u += dt*a*(b*V - u)  ->  dt*u = dt*u*(1 - dt*a) + dt*dt*a*b*V
+            mul(V, AB, s)
+            U *= A1
+            U += s
+            gt(V, Vpeak, out=spike)
+            if (i + 1) % record_every == 0:  # row j holds V after step (j + 1) * record_every
+                np.copyto(rows[i // record_every], V)
+                np.copyto(rows[i // record_every], Vpeak, where=spike)
+            if spike.any():
+                idx = np.flatnonzero(spike)
+                spike_steps.append(np.full(idx.size, i))
+                spike_idx.append(idx)
+                V[idx] = c[idx]
+                U[idx] += dtd[idx]
+        self.u[0] = U / dt
+        if spike_steps:
+            return trace, np.concatenate(spike_steps), np.concatenate(spike_idx)
+        return trace, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+
+def throughput(n, steps=1000, I=0.0, backend="numpy"):  # neuron-steps/second of IzhikevichPopulation.step
+    pop = IzhikevichPopulation(n, -60, -40, 35, 0.03, -2, -50, 100, 0.7, I, 100, backend=backend)
+    pop.step()  # warm-up, compiles the numba and torch steps
+    start = time.perf_counter()
+    for _ in range(steps):
+        pop.step()
+    elapsed = time.perf_counter() - start
+    return n * steps / elapsed
+
+
+if __name__ == "__main__":
+    for exp in range(0, 8):
+        n = 10 ** exp
+        steps = max(10, min(10000, 10 ** 7 // n))
+        print(f"n={n:>10}  {throughput(n, steps, I=70):.3e} neuron-steps/s")
@@ -0,0 +1,194 @@
+import time
+import numpy as np
+
+"""
+Probes: traces of the state of chosen neurons of a WhiteMatter region, decimated while they are recorded
+
+Probe(brain, region, neurons=..., layers=...) follows the neurons given by index in the region and / or all neurons
+of the given layers, and attaches to brain.recorders, so after each step_all() it gathers
+
+V  population.V_out, the membrane potential with the spikes at Vpeak
+u  population.u_out summed over the recovery variables
+I  region.I_in, the thalamic noise plus the synaptic input of the step
+
+for these neurons only: the gather is np.take into the buffer (a slice copy when the neurons are contiguous), so a
+step costs O(probed neurons) and nothing in the size of the region. With stride=s the probe keeps every s-th step
+("sample") or the minimum and the maximum over each block of s steps ("minmax", which keeps the spikes visible
+at any decimation). Samples go into chunks of chunk rows preallocated per variable; a new chunk is allocated when
+the last one is full, the memory is that of the kept samples.
+"""
+
+state_variables = ("V", "u", "I")
+
+
+class Probe:  # decimated traces of some neurons of one region, recorded after every WhiteMatter.step_all
+    def __init__(self, brain, region, neurons=None, layers=None, variables=("V",), stride=1, decimate="sample",
+                 chunk=1024):  # region: index or name, neurons: indices in the region, layers: layer ids
+        if decimate not in ("sample", "minmax"):
+            raise ValueError(f"decimate must be 'sample' or 'minmax', not {decimate!r}")
+        unknown = set(variables) - set(state_variables)
+        if unknown:
+            raise ValueError(f"unknown variables {sorted(unknown)}")
+        self.brain = brain
+        if isinstance(region, str):
+            region = [r.name for r in brain.grey_matter].index(region)
+        self.region = brain.grey_matter[region]
+        selected = [] if neurons is None else [np.asarray(neurons, dtype=np.int64).ravel()]
+        for layer in self.region.layers:
+            if layers is not None and layer.id in layers:
+                selected.append(np.arange(layer.offset, layer.offset + layer.size))
+        if neurons is None and layers is None:
+            selected.append(np.arange(self.region.size))
+        self.neurons = np.unique(np.concatenate(selected)) if selected else np.zeros(0, dtype=np.int64)
+        if self.neurons.size and (self.neurons[0] < 0 or self.neurons[-1] >= self.region.size):
+            raise IndexError(f"neuron indices out of range for region {self.region.name} of {self.region.size}")
+        k = self.neurons.size
+        if k and self.neurons[-1] - self.neurons[0] == k - 1:  # contiguous, gather with a slice
+            self._index = slice(int(self.neurons[0]), int(self.neurons[-1]) + 1)
+        else:
+            self._index = self.neurons
+        self.variables = tuple(variables)
+        self.stride = stride
+        self.decimate = decimate
+        self.chunk = chunk
+        self._shape = (chunk, k) if decimate == "sample" else (chunk, 2, k)
+        self.chunks = {name: [] for name in self.variables}  # full chunks per variable
+        self.chunk_steps = []  # step of each row of the full chunks
+        self._new_chunk()
+        self.rows = 0  # rows of the current chunk in use
+        self.phase = 0  # steps into the current stride block
+        if decimate == "minmax":
+            self._value = np.empty(k)
+            self._lo = {name: np.empty(k) for name in self.variables}
+            self._hi = {name: np.empty(k) for name in self.variables}
+        if self.region.population.m > 1 and "u" in self.variables:
+            self._u = np.empty((self.region.population.m, k))
+        brain.recorders.append(self)
+
+    def _new_chunk(self):
+        self.buffers = {name: np.empty(self._shape) for name in self.variables}
+        self.steps = np.empty(self.chunk, dtype=np.int64)
+
+    def _gather(self, name, out):  # the probed values of a variable into out
+        population, index = self.region.population, self._index
+        if name == "V":
+            source = population.V_out
+        elif name == "I":
+            source = self.region.I_in
+        elif population.m == 1:
+            source = population.u_out[0]
+        else:
+            if isinstance(index, slice):
+                population.u_out[:, index].sum(axis=0, out=out)
+            else:
+                np.take(population.u_out, index, axis=1, out=self._u).sum(axis=0, out=out)
+            return
+        if isinstance(index, slice):
+            out[:] = source[index]
+        else:
+            np.take(source, index, out=out)
+
+    def record(self):  # called by WhiteMatter.step_all
+        step = self.region.iteration - 1
+        if self.decimate == "sample":
+            if self.phase == 0:
+                for name in self.variables:
+                    self._gather(name, self.buffers[name][self.rows])
+                self.steps[self.rows] = step
+                self._advance()
+            self.phase = (self.phase + 1) % self.stride
+            return
+        for name in self.variables:
+            lo, hi = self._lo[name], self._hi[name]
+            if self.phase == 0:
+                self._gather(name, lo)
+                hi[:] = lo
+                continue
+            self._gather(name, self._value)
+            np.minimum(lo, self._value, out=lo)
+            np.maximum(hi, self._value, out=hi)
+        if self.phase == 0:
+            self.steps[self.rows] = step
+        self.phase += 1
+        if self.phase == self.stride:
+            self._emit()
+
+    def _emit(self):  # writes the min / max of the block into the current row
+        for name in self.variables:
+            self.buffers[name][self.rows, 0] = self._lo[name]
+            self.buffers[name][self.rows, 1] = self._hi[name]
+        self.phase = 0
+        self._advance()
+
+    def _advance(self):
+        self.rows += 1
+        if self.rows == self.chunk:
+            for name in self.variables:
+                self.chunks[name].append(self.buffers[name])
+            self.chunk_steps.append(self.steps)
+            self._new_chunk()
+            self.rows = 0
+
+    def close(self):  # detaches from the brain, a partial minmax block is kept as a last row
+        if self in self.brain.recorders:
+            self.brain.recorders.remove(self)
+        if self.decimate == "minmax" and self.phase:
+            self._emit()
+        return self
+
+    def trace(self, name="V"):
+        # (times in ms of the rows, values (rows, neurons) or (rows, 2, neurons) of min and max), a copy
+        values = np.concatenate(self.chunks[name] + [self.buffers[name][:self.rows]])
+        steps = np.concatenate(self.chunk_steps + [self.steps[:self.rows]])
+        return (steps + 1.0) * self.region.dt, values
+
+    @property
+    def nbytes(self):  # bytes of the allocated buffers
+        return sum(buffer.nbytes for chunks in self.chunks.values() for buffer in chunks) + \
+            sum(buffer.nbytes for buffer in self.buffers.values())
+
+    def to_npz(self, file_name):  # times, neurons and one array per variable
+        np.savez(file_name, neurons=self.neurons, times=self.trace(self.variables[0])[0],
+                 **{name: self.trace(name)[1] for name in self.variables})
+
+
+def benchmark(brain_data, probed=(10, 1000), steps=500, stride=10):
+    # {(probed neurons, decimate): seconds per Probe.record()} on the largest region of the brain and its size
+    from .grey_white_matter import WhiteMatter
+    brain = WhiteMatter(brain_data, seed=0)
+    region = max(range(len(brain.grey_matter)), key=lambda i: brain.grey_matter[i].size)
+    brain.step_all()
+    size = brain.grey_matter[region].size
+    results = {}
+    for k in probed:
+        neurons = np.linspace(0, size - 1, min(k, size)).astype(np.int64)
+        for decimate in ("sample", "minmax"):
+            probe = Probe(brain, region, neurons, variables=state_variables, stride=stride, decimate=decimate)
+            brain.recorders.remove(probe)  # timed alone
+            start = time.perf_counter()
+            for _ in range(steps):
+                probe.record()
+            results[k, decimate] = (time.perf_counter() - start) / steps
+    return results, size
+
+
+if __name__ == "__main__":
+    import json
+    from .grey_white_matter import WhiteMatter, scale_brain
+    with open("brain-data.json") as bf:
+        sample = json.load(bf)
+    for label, data in (("sample brain", sample), ("100x layer size", scale_brain(sample, size_factor=100)),
+                        ("1000x layer size", scale_brain(sample, size_factor=1000))):
+        results, size = benchmark(data)
+        print(f"{label:>17} region of {size:>7} neurons: " + "  ".join(
+            f"{k} {decimate} {seconds * 1e6:6.1f} us" for (k, decimate), seconds in results.items()))
+    brain = WhiteMatter(scale_brain(sample, size_factor=100), seed=0)
+    region = brain.grey_matter[0]
+    probe = Probe(brain, 0, layers=[region.layers[0].id], variables=("V", "u"), stride=20, decimate="minmax",
+                  chunk=64)
+    for _ in range(2000):
+        brain.step_all()
+    probe.close()
+    times, V = probe.trace("V")
+    print(f"{probe.neurons.size} neurons of layer {region.layers[0].id}, {times.size} rows over {times[-1]} ms, "
+          f"{probe.nbytes / 2 ** 20:.2f} MiB, V max {V[:, 1].max():.1f} min {V[:, 0].min():.1f}")
@@ -0,0 +1,100 @@
+import time
+import threading
+import numpy as np
+
+"""
+Background stepping for the interactive explorers
+
+Producer runs sim.step() in a daemon thread at rate * speed steps per second, independent of the frame rate of the
+display. rate is the speed 1 pace, the one step per 30 ms frame of the old FuncAnimation loop. The display calls
+drain() once per frame and gets the (x, y) samples produced since the previous call, decimated so that about
+display_rate samples per second reach the plot whatever the speed. A step that reports a spike (third value of the
+step() tuple) is always kept, so decimation does not drop spikes from the V trace.
+
+updatevar() only queues the new parameters, the thread applies them between two steps: the sim is never changed
+while it steps.
+"""
+
+
+class Producer:  # steps a sim in a background thread, the display drains decimated samples
+    def __init__(self, sim, rate=33.0, speed=1.0, display_rate=330.0, batch=256):
+        self.sim = sim
+        self.rate = rate
+        self.display_rate = display_rate
+        self.batch = batch  # most steps between two checks for new parameters
+        self.lock = threading.Lock()
+        self.steps = 0
+        self._x = []
+        self._y = []
+        self._pending = None
+        self._thread = None
+        self._running = False
+        self.speed = speed
+
+    @property
+    def speed(self):
+        return self._speed
+
+    @speed.setter
+    def speed(self, value):
+        with self.lock:
+            self._speed = value
+            self.decimate = max(1, int(self.rate * value / self.display_rate))
+            self._restart = True  # pace from now on, do not catch up on the old speed
+
+    def updatevar(self, *args):  # applied by the producer thread before its next step
+        with self.lock:
+            self._pending = args
+
+    def drain(self):  # x and y samples since the last call
+        with self.lock:
+            x, y = self._x, self._y
+            self._x, self._y = [], []
+        return np.array(x, dtype=np.float64), np.array(y, dtype=np.float64)
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        step = self.sim.step
+        count = 0
+        start = done = 0
+        while self._running:
+            with self.lock:
+                pending, self._pending = self._pending, None
+                if self._restart:
+                    start, done, self._restart = time.perf_counter(), 0, False
+                target, decimate = self.rate * self._speed, self.decimate
+            if pending is not None:
+                self.sim.updatevar(*pending)
+            now = time.perf_counter()
+            due = int((now - start) * target) - done
+            if due <= 0:
+                time.sleep(min(0.005, (done + 1) / target - (now - start)))
+                continue
+            if due > target / 4:  # the sim can not keep up, run as fast as it can instead of building up a backlog
+                start, done = now, 0
+            due = min(due, self.batch)
+            x, y = [], []
+            for _ in range(due):
+                out = step()
+                count += 1
+                if count >= decimate or (len(out) > 2 and out[2]):
+                    x.append(out[0])
+                    y.append(out[1])
+                    count = 0
+            done += due
+            with self.lock:
+                self.steps += due
+                self._x.extend(x)
+                self._y.extend(y)
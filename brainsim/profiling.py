@@ -0,0 +1,164 @@
+import csv
+import json
+import time
+import numpy as np
+
+"""
+Per region and per layer instrumentation of WhiteMatter.step_all
+
+Profiler(brain, window) attaches itself to a WhiteMatter: step_all() then runs the same updates through
+Profiler.step_all(), which counts per window of steps
+
+region  step_s       wall time of GreyMatter.step (all layers of a region step in one batched update)
+        propagate_s  wall time of scattering its spikes into the delay ring buffers of the targets
+layer   spikes       spikes emitted
+        events_out   synaptic events its spikes delivered
+        events_in    synaptic events delivered into it
+        occupancy    fraction of non zero entries of its delay ring buffer, sampled at the end of the window
+
+Rows identify their region by region_index (position in brain.grey_matter), region_id and the region name, which
+need not be unique. The region rows carry the sums of their layers. Every window is closed into rows (records, a
+list of dicts), so the memory grows with steps / window and not with the steps. stop() closes the last partial
+window and detaches: the brain then pays one attribute test per step_all(). top() ranks the regions by the time they
+took, keyed by region_index, to_csv() and to_json() export the rows.
+"""
+
+fields = ["window", "first_step", "steps", "level", "region_index", "region_id", "region", "layer", "step_s",
+          "propagate_s", "spikes", "events_out", "events_in", "occupancy"]
+
+
+class Profiler:  # counters of a WhiteMatter, closed into rows every window steps
+    def __init__(self, brain, window=1000):
+        self.brain = brain
+        self.window = window
+        regions = brain.grey_matter
+        counts = [len(region.layers) for region in regions]
+        self.layer_offset = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        n_layers = int(self.layer_offset[-1])
+        # flat layer index of the target / source of every outgoing projection, in the order of brain.outgoing
+        self.target_layer = [np.array([self.layer_offset[p.target[0]] + p.target[1] for p in out], dtype=np.int64)
+                             for out in brain.outgoing]
+        self.source_layer = [np.array([self.layer_offset[p.source[0]] + p.source[1] for p in out], dtype=np.int64)
+                             for out in brain.outgoing]
+        self._events = [np.zeros(len(out), dtype=np.int64) for out in brain.outgoing]
+        self.step_ns = np.zeros(len(regions), dtype=np.int64)
+        self.propagate_ns = np.zeros(len(regions), dtype=np.int64)
+        self.spikes = np.zeros(n_layers, dtype=np.int64)
+        self.events_out = np.zeros(n_layers, dtype=np.int64)
+        self.events_in = np.zeros(n_layers, dtype=np.int64)
+        self.steps = 0
+        self.windows = 0
+        self.first_step = regions[0].iteration if regions else 0
+        self.records = []
+        brain.profiler = self
+
+    def stop(self):  # closes the partial window and detaches from the brain
+        if self.steps:
+            self._close()
+        self.brain.profiler = None
+        return self
+
+    def step_all(self):  # WhiteMatter.step_all with the counters
+        brain, clock = self.brain, time.perf_counter_ns
+        for i, region in enumerate(brain.grey_matter):
+            start = clock()
+            region.step()
+            self.step_ns[i] += clock() - start
+            if region.spiking.size:
+                offset = self.layer_offset[i]
+                for j, spiking in enumerate(region.layer_spiking):
+                    self.spikes[offset + j] += spiking.size
+        for i, events in enumerate(self._events):
+            if not events.size:
+                continue
+            start = clock()
+            brain.propagate_region(i, events)
+            self.propagate_ns[i] += clock() - start
+            if events.any():
+                np.add.at(self.events_in, self.target_layer[i], events)
+                np.add.at(self.events_out, self.source_layer[i], events)
+                events[:] = 0
+        self.steps += 1
+        if self.steps >= self.window:
+            self._close()
+
+    def _close(self):
+        common = {"window": self.windows, "first_step": self.first_step, "steps": self.steps}
+        for i, region in enumerate(self.brain.grey_matter):
+            lo, hi = self.layer_offset[i], self.layer_offset[i + 1]
+            # region names need not be unique, the index in brain.grey_matter identifies the region
+            ids = dict(common, region_index=i, region_id=region.id, region=region.name)
+            layer_rows = []
+            for j, layer in enumerate(region.layers):
+                k = lo + j
+                layer_rows.append(dict(ids, level="layer", layer=layer.id, step_s=None,
+                                       propagate_s=None, spikes=int(self.spikes[k]),
+                                       events_out=int(self.events_out[k]), events_in=int(self.events_in[k]),
+                                       occupancy=np.count_nonzero(layer.pending) / max(layer.pending.size, 1)))
+            self.records.append(dict(ids, level="region", layer=None,
+                                     step_s=float(self.step_ns[i] * 1e-9),
+                                     propagate_s=float(self.propagate_ns[i] * 1e-9),
+                                     spikes=int(self.spikes[lo:hi].sum()), events_out=int(self.events_out[lo:hi].sum()),
+                                     events_in=int(self.events_in[lo:hi].sum()),
+                                     occupancy=np.count_nonzero(region.pending) / max(region.pending.size, 1)))
+            self.records.extend(layer_rows)
+        for counter in (self.step_ns, self.propagate_ns, self.spikes, self.events_out, self.events_in):
+            counter[:] = 0
+        self.first_step += self.steps
+        self.steps = 0
+        self.windows += 1
+
+    def rows(self, level=None):  # closed rows, only "region" or "layer" rows if level is given
+        return [row for row in self.records if level is None or row["level"] == level]
+
+    def top(self, n=10):
+        # [(region index, name, seconds)] of the n regions with the most step + propagate time over all windows
+        total = {}
+        for row in self.rows("region"):
+            total[row["region_index"]] = total.get(row["region_index"], 0.0) + row["step_s"] + row["propagate_s"]
+        regions = self.brain.grey_matter
+        return [(i, regions[i].name, seconds) for i, seconds in sorted(total.items(), key=lambda item: -item[1])[:n]]
+
+    def to_csv(self, file_name):
+        with open(file_name, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+    def to_json(self, file_name):
+        with open(file_name, "w") as f:
+            json.dump({"window": self.window, "rows": self.records}, f, indent=1)
+
+
+def benchmark(brain_data, steps=500, window=100):  # seconds per step_all without and with a Profiler attached
+    from .grey_white_matter import WhiteMatter
+    results = {}
+    for mode in ("off", "on"):
+        brain = WhiteMatter(brain_data, seed=0)
+        if mode == "on":
+            Profiler(brain, window)
+        brain.step_all()
+        start = time.perf_counter()
+        for _ in range(steps):
+            brain.step_all()
+        results[mode] = (time.perf_counter() - start) / steps
+    return results
+
+
+if __name__ == "__main__":
+    from .grey_white_matter import WhiteMatter, scale_brain
+    with open("brain-data.json") as bf:
+        sample = json.load(bf)
+    for label, data, steps in (("sample brain", sample, 2000), ("100x chunks", scale_brain(sample, copies=100), 100),
+                               ("100x layer size", scale_brain(sample, size_factor=100), 200)):
+        r = benchmark(data, steps)
+        print(f"{label:>16}: {r['off'] * 1e6:9.1f} us/step, with profiler {r['on'] * 1e6:9.1f} us/step")
+    brain = WhiteMatter(scale_brain(sample, copies=3, size_factor=10), seed=0)
+    profiler = Profiler(brain, window=100)
+    for _ in range(300):
+        brain.step_all()
+    profiler.stop()
+    for i, region, seconds in profiler.top(5):
+        print(f"{i:>4} {region:>20}: {seconds * 1e3:8.2f} ms")
+    for row in profiler.rows("layer")[:6]:
+        print(row)
@@ -0,0 +1,65 @@
+import time
+import numpy as np
+from .populations import Izhikevich2003Population
+
+"""
+Headless batch runs of the firing regimes of the Izhikevich 2003 model (izhikevich 20 models.py)
+
+Every row (a, b, c, d, I) of a parameter table is one neuron of an Izhikevich2003Population, all rows are simulated
+together with the model's 0.2 ms step. Tables of thousands of rows work the same way, use record_every to keep the
+V traces small.
+"""
+
+names = ["tonic spiking", "phasic spiking", "tonic bursting", "phasic bursting", "mixed mode",
+         "spike frequency adaptation", "Class 1", "Class 2", "spike latency", "subthreshold oscillations",
+         "resonator", "integrator", "rebound spike", "rebound burst", "threshold variability", "bistability", "DAP",
+         "accomodation", "inhibition-induced spiking", "inhibition-induced bursting"]
+
+# taken from demo izhikevich
+par = [[0.02, 0.2, -65, 6, 14],  # tonic spiking
+       [0.02, 0.25, -65, 6, 0.5],  # phasic spiking
+       [0.02, 0.2, -50, 2, 15],  # tonic bursting
+       [0.02, 0.25, -55, 0.05, 0.6],  # phasic bursting
+       [0.02, 0.2, -55, 4, 10],  # mixed mode
+       [0.01, 0.2, -65, 8, 30],  # spike frequency adaptation
+       [0.02, -0.1, -55, 6, 0],  # Class 1
+       [0.2, 0.26, -65, 0, 0],  # Class 2
+       [0.02, 0.2, -65, 6, 7],  # spike latency
+       [0.05, 0.26, -60, 0, 0],  # subthreshold oscillations
+       [0.1, 0.26, -60, -1, 0],  # resonator
+       [0.02, -0.1, -55, 6, 0],  # integrator
+       [0.03, 0.25, -60, 4, 0],  # rebound spike
+       [0.03, 0.25, -52, 0, 0],  # rebound burst
+       [0.03, 0.25, -60, 4, 0],  # threshold variability
+       [1, 1.5, -60, 0, -65],  # bistability
+       [1, 0.2, -60, -21, 0],  # DAP
+       [0.02, 1, -55, 4, 0],  # accomodation
+       [-0.02, -1, -60, 8, 80],  # inhibition-induced spiking
+       [-0.026, -1, -45, 0, 80]]  # inhibition-induced bursting
+
+
+def run_regimes(table=par, duration=10000.0, dt=0.2, Vpeak=30, V0=-65.0, record_every=1):
+    # returns the trace times [ms], the V traces (time, row) and the spike times [ms] of every row
+    table = np.asarray(table, dtype=np.float64).reshape(-1, 5)
+    a, b, c, d, I = table.T
+    pop = Izhikevich2003Population(len(table), a, b, c, d, I, Vpeak=Vpeak, dt=dt, V0=V0)
+    steps = int(round(duration / dt))
+    trace, spike_steps, spike_rows = pop.run(steps, record_every)
+    # step i ends at (i + 1) * dt, the time of its trace row and of its spikes (as SpikeReader.trains)
+    t = (np.arange(trace.shape[0]) + 1) * record_every * dt
+    order = np.argsort(spike_rows, kind='stable')
+    counts = np.bincount(spike_rows, minlength=len(table))
+    spikes = np.split((spike_steps[order] + 1) * dt, np.cumsum(counts)[:-1])
+    return t, trace, spikes
+
+
+if __name__ == "__main__":
+    run_regimes(duration=100)  # warm-up
+    start = time.perf_counter()
+    t, V, spikes = run_regimes()
+    print(f"20 regimes, 10 s simulated in {time.perf_counter() - start:.3f} s")
+    for name, times in zip(names, spikes):
+        print(f"{name:>28}: {times.size:5d} spikes")
+    start = time.perf_counter()
+    run_regimes(np.tile(par, (250, 1)), record_every=50)
+    print(f"5000 rows, 10 s simulated in {time.perf_counter() - start:.3f} s")
@@ -0,0 +1,137 @@
+import time
+import numpy as np
+
+"""
+Blitted rendering for the interactive explorers
+
+RingBuffer keeps the last n values in an array of length 2n, every value is written twice (at i and i + n) so the
+history from oldest to newest is always the contiguous slice data[head:head + n], no shifting and no copying.
+
+BlitRenderer draws the figure once with the animated lines left out and keeps that as background. Every frame
+restores the background, updates the data of the animated lines and draws only them. Anything drawn normally
+(nullclines, quivers, sliders) is static for the renderer: after changing it call fig.canvas.draw_idle(), the next
+full draw captures the new background.
+
+matplotlib is imported by the caller, this module only uses the figure it is given.
+"""
+
+
+class RingBuffer:  # fixed size history
+    def __init__(self, size, fill=0.0):
+        self.size = size
+        self.data = np.full(2 * size, fill, dtype=np.float64)
+        self.head = 0
+
+    def push(self, values):  # one value or an array of values, oldest first
+        values = np.atleast_1d(values)
+        if values.size >= self.size:
+            values = values[-self.size:]
+        k = values.size
+        if k == 1:
+            self.data[self.head] = self.data[self.head + self.size] = values[0]
+        else:
+            idx = (self.head + np.arange(k)) % self.size
+            self.data[idx] = values
+            self.data[idx + self.size] = values
+        self.head = (self.head + k) % self.size
+
+    def view(self):  # oldest to newest
+        return self.data[self.head:self.head + self.size]
+
+
+class BlitRenderer:  # animated Line2D artists over a cached background
+    def __init__(self, fig, interval=16):
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.interval = interval
+        self.lines = []  # (line, x, y), x and y are RingBuffers or fixed arrays
+        self.background = None
+        self.timer = None
+        self.produce = None
+        self.frames = 0
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def add_line(self, ax, x, y, **kwargs):
+        line, = ax.plot(self._data(x), self._data(y), animated=True, **kwargs)
+        self.lines.append((line, x, y))
+        return line
+
+    @staticmethod
+    def _data(values):
+        return values.view() if isinstance(values, RingBuffer) else values
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_lines()
+
+    def _draw_lines(self):
+        for line, x, y in self.lines:
+            line.set_data(self._data(x), self._data(y))
+            line.axes.draw_artist(line)
+
+    def refresh(self):  # redraw the animated lines only
+        if self.background is None:
+            return
+        self.canvas.restore_region(self.background)
+        self._draw_lines()
+        self.canvas.blit(self.fig.bbox)
+        self.frames += 1
+
+    def _frame(self):
+        if self.produce is not None:
+            self.produce()
+        self.refresh()
+
+    def start(self, produce=None):  # call produce() then refresh() every interval ms
+        self.produce = produce
+        self.timer = self.canvas.new_timer(interval=self.interval)
+        self.timer.add_callback(self._frame)
+        self.timer.start()
+        return self.timer
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+            self.timer = None
+
+
+def benchmark(history=10000, frames=300):  # frames/second, blitted ring buffers vs clear and replot of lists
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    results = {}
+    v = np.linspace(-500, 500, 2000)
+    x2 = np.arange(-history, 0)
+    for mode in ('replot', 'blit'):
+        fig, (ax2, ax3) = plt.subplots(2, 1)
+        ax2.plot(v, 0.04 * v ** 2 + 5 * v + 140, lw=2)
+        fig.canvas.draw()
+        if mode == 'replot':
+            y2 = [0.0] * history
+            start = time.perf_counter()
+            for n in range(frames):
+                ax3.clear()
+                y2.pop(0)
+                y2.append(np.sin(n / 10))
+                ax3.plot(x2, y2, color='b')
+                fig.canvas.draw()
+        else:
+            renderer = BlitRenderer(fig)
+            trace = RingBuffer(history)
+            renderer.add_line(ax3, x2, trace, color='b')
+            ax3.set_xlim(-history, 0)
+            ax3.set_ylim(-1, 1)
+            fig.canvas.draw()
+            start = time.perf_counter()
+            for n in range(frames):
+                trace.push(np.sin(n / 10))
+                renderer.refresh()
+        results[mode] = frames / (time.perf_counter() - start)
+        plt.close(fig)
+    return results
+
+
+if __name__ == "__main__":
+    for history in (1000, 10000):
+        r = benchmark(history)
+        print(f"{history:>6} point history: replot {r['replot']:7.1f} fps  blit {r['blit']:7.1f} fps")
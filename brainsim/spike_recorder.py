@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import tempfile
+import numpy as np
+
+"""
+Address event recording of the spikes of a WhiteMatter into append-only memory mapped files
+
+Every spike is one record (neuron, step) of two uint32, 8 bytes, appended in the order of the steps. SpikeRecorder
+attaches to brain.recorders and after each step_all() appends region.spiking of every region that spiked: neuron is
+the index in the brain (region offset + index in the region) with one file for the whole brain, or the index in the
+region with split=True and one file per region. The records are written straight into a memory map of the next
+chunk records of the file; when it is full the map is flushed and dropped, the file is extended by one chunk and
+the new tail mapped. The process holds one chunk whatever the length of the run, the page cache writes the rest
+back, and a step costs a copy of its spike indices per spiking region.
+
+spikes.json next to the files describes them: the regions with their offsets and layers, dt, and the records
+written so far, updated at every chunk and by close(), which also trims the unused tail of the last chunk. A
+SpikeReader can open a recording while it is still written and sees the records up to the last chunk.
+
+SpikeReader.events() and window() return read-only memory maps of the files, nothing is read before it is used;
+steps are non decreasing so window() finds a range of steps by binary search. Only the combination of regions that
+live in other files (events() of one region of an unsplit recording, or of all regions of a split one) is a copy.
+"""
+
+dtype = np.dtype([("neuron", "<u4"), ("step", "<u4")])
+
+
+class EventFile:  # append-only file of (neuron, step) records written through a memory map of its last chunk
+    def __init__(self, path, chunk=1 << 16):
+        self.path = path
+        self.chunk = chunk
+        self.count = 0  # records appended
+        self.base = 0  # first record of the mapped chunk
+        open(path, "wb").close()
+        self._map()
+
+    def _map(self):
+        with open(self.path, "r+b") as f:
+            f.truncate((self.base + self.chunk) * dtype.itemsize)
+        self.window = np.memmap(self.path, dtype=dtype, mode="r+", offset=self.base * dtype.itemsize,
+                                shape=(self.chunk,))
+        # plain ndarray views of the fields, slicing a memmap costs several microseconds per step
+        window = self.window.view(np.ndarray)
+        self.neuron, self.step = window["neuron"], window["step"]
+
+    def append(self, neurons, step, offset=0):  # records (neurons + offset, step), returns True when a chunk filled up
+        pos = self.count - self.base
+        n = neurons.size
+        if pos + n < self.chunk:
+            np.add(neurons, offset, out=self.neuron[pos:pos + n], casting="unsafe")
+            self.step[pos:pos + n] = step
+            self.count += n
+            return False
+        k = self.chunk - pos
+        np.add(neurons[:k], offset, out=self.neuron[pos:], casting="unsafe")
+        self.step[pos:] = step
+        self.count += k
+        self.window.flush()
+        self.base = self.count
+        self._map()
+        self.append(neurons[k:], step, offset)
+        return True
+
+    def close(self):  # flushes and trims the file to the records appended
+        if self.window is None:
+            return
+        self.window.flush()
+        self.window = self.neuron = self.step = None
+        with open(self.path, "r+b") as f:
+            f.truncate(self.count * dtype.itemsize)
+
+
+class SpikeRecorder:  # records the spikes of a WhiteMatter into the directory path until close()
+    def __init__(self, brain, path, split=False, chunk=1 << 16):
+        self.brain = brain
+        self.path = path
+        self.split = split
+        os.makedirs(path, exist_ok=True)
+        regions = brain.grey_matter
+        offsets = np.concatenate([[0], np.cumsum([region.size for region in regions])]).astype(np.int64)
+        if offsets[-1] >= 2 ** 32:
+            raise ValueError(f"{offsets[-1]} neurons do not fit the uint32 neuron field")
+        if split:
+            self.files = [EventFile(os.path.join(path, f"region{i}.spikes"), chunk) for i in range(len(regions))]
+            # (region, file, offset added to its spike indices) for every region
+            self._targets = [(region, file, 0) for region, file in zip(regions, self.files)]
+        else:
+            self.files = [EventFile(os.path.join(path, "brain.spikes"), chunk)]
+            self._targets = [(region, self.files[0], int(offset)) for region, offset in zip(regions, offsets)]
+        self.meta = {
+            "dtype": [list(field) for field in dtype.descr], "split": split, "chunk": chunk,
+            "dt": regions[0].dt if regions else None,
+            "first_step": regions[0].iteration if regions else 0,
+            "regions": [{"name": region.name, "id": region.id, "offset": int(offset), "size": int(region.size),
+                         "layers": [{"layer": layer.id, "offset": int(layer.offset), "size": int(layer.size)}
+                                    for layer in region.layers]}
+                        for region, offset in zip(regions, offsets)],
+            "files": [os.path.basename(file.path) for file in self.files],
+            "counts": [0] * len(self.files),
+            "closed": False,
+        }
+        self._write_meta()
+        brain.recorders.append(self)
+
+    def record(self):  # called by WhiteMatter.step_all, appends the spikes of the step just taken
+        filled = False
+        for region, file, offset in self._targets:
+            if region.spiking.size:
+                filled |= file.append(region.spiking, region.iteration - 1, offset)
+        if filled:
+            self._write_meta()
+
+    def _write_meta(self):
+        self.meta["counts"] = [file.count for file in self.files]
+        with open(os.path.join(self.path, "spikes.json"), "w") as f:
+            json.dump(self.meta, f, indent=1)
+
+    @property
+    def count(self):  # spikes recorded so far
+        return sum(file.count for file in self.files)
+
+    def close(self):  # detaches from the brain, flushes and trims the files
+        if self in self.brain.recorders:
+            self.brain.recorders.remove(self)
+        for file in self.files:
+            file.close()
+        self.meta["closed"] = True
+        self._write_meta()
+        return self
+
+
+class SpikeReader:  # read-only view of a SpikeRecorder directory
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "spikes.json")) as f:
+            self.meta = json.load(f)
+        self.dtype = np.dtype([tuple(field) for field in self.meta["dtype"]])
+        self.dt = self.meta["dt"]
+        self.split = self.meta["split"]
+        self.regions = self.meta["regions"]
+        self._maps = [self._open(name, count) for name, count in zip(self.meta["files"], self.meta["counts"])]
+
+    def _open(self, name, count):
+        if count == 0:
+            return np.zeros(0, dtype=self.dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=self.dtype, mode="r", shape=(count,))
+
+    def _region(self, region):  # index of a region given by index or name
+        if isinstance(region, str):
+            return [r["name"] for r in self.regions].index(region)
+        return region
+
+    def events(self, region=None):
+        # records of one region with neuron indices in the region, or of the whole brain with indices in the brain
+        if region is None:
+            if not self.split:
+                return self._maps[0]
+            merged = np.concatenate(self._maps) if self._maps else np.zeros(0, dtype=self.dtype)
+            merged["neuron"] += np.repeat(np.array([r["offset"] for r in self.regions], dtype=np.uint32),
+                                          [m.size for m in self._maps])
+            return merged[np.argsort(merged["step"], kind="stable")]
+        i = self._region(region)
+        if self.split:
+            return self._maps[i]
+        events = self._maps[0]
+        lo, size = self.regions[i]["offset"], self.regions[i]["size"]
+        selected = events[(events["neuron"] >= lo) & (events["neuron"] < lo + size)]
+        selected["neuron"] -= np.uint32(lo)
+        return selected
+
+    def window(self, start, stop, region=None):  # records of the steps start <= step < stop, a view of events()
+        events = self.events(region)
+        lo, hi = events["step"].searchsorted([start, stop])
+        return events[lo:hi]
+
+    def size(self, region=None):  # neurons of a region or of the brain
+        if region is None:
+            return sum(r["size"] for r in self.regions)
+        return self.regions[self._region(region)]["size"]
+
+    def counts(self, region=None):  # spikes per neuron
+        return np.bincount(self.events(region)["neuron"], minlength=self.size(region))
+
+    def trains(self, region=None):  # spike times in ms per neuron, with step 0 ending at dt
+        events = self.events(region)
+        order = np.argsort(events["neuron"], kind="stable")
+        times = (events["step"][order] + 1.0) * self.dt
+        return np.split(times, np.cumsum(np.bincount(events["neuron"], minlength=self.size(region)))[:-1])
+
+
+def benchmark(brain_data, steps=500, chunk=1 << 16):
+    # {mode: seconds per step_all} without recorder and recording into one file / one file per region, the spikes
+    # recorded and the seconds to read back the spike trains of the whole brain
+    from .grey_white_matter import WhiteMatter
+    results = {}
+    with tempfile.TemporaryDirectory() as path:  # the recordings
+        for mode in ("off", "brain", "split"):
+            brain = WhiteMatter(brain_data, seed=0)
+            recorder = None if mode == "off" else SpikeRecorder(brain, os.path.join(path, mode), mode == "split",
+                                                                 chunk)
+            brain.step_all()
+            start = time.perf_counter()
+            for _ in range(steps):
+                brain.step_all()
+            results[mode] = (time.perf_counter() - start) / steps
+            if recorder is not None:
+                recorder.close()
+                results[mode + " spikes"] = recorder.count
+                start = time.perf_counter()
+                SpikeReader(os.path.join(path, mode)).trains()
+                results[mode + " read"] = time.perf_counter() - start
+    return results
+
+
+if __name__ == "__main__":
+    import resource
+    from .grey_white_matter import WhiteMatter, scale_brain
+    with open("brain-data.json") as bf:
+        sample = json.load(bf)
+    for label, data, steps in (("sample brain", sample, 2000), ("100x chunks", scale_brain(sample, copies=100), 100),
+                               ("100x layer size", scale_brain(sample, size_factor=100), 200)):
+        r = benchmark(data, steps)
+        print(f"{label:>16}: {r['off'] * 1e6:9.1f} us/step, recording {r['brain'] * 1e6:9.1f} us/step, "
+              f"split {r['split'] * 1e6:9.1f} us/step, {r['brain spikes']} spikes, read {r['brain read']:.3f} s")
+    brain = WhiteMatter(scale_brain(sample, size_factor=100), seed=0)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        recorder = SpikeRecorder(brain, tmpdir, chunk=1 << 16)
+        for block in range(4):
+            for _ in range(500):
+                brain.step_all()
+            print(f"step {brain.grey_matter[0].iteration}: {recorder.count} spikes "
+                  f"({recorder.count * dtype.itemsize / 2 ** 20:.1f} MiB on disk), "
+                  f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10:.1f} MiB")
+        recorder.close()
+        reader = SpikeReader(tmpdir)
+        print(reader.window(1000, 1010)[:5], reader.counts(0)[:10])
+        del reader
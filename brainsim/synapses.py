@@ -0,0 +1,110 @@
+import numpy as np
+from .topology import Topology
+
+"""
+Sparse synaptic propagation compiled from the genome
+
+Every (input_layers[i], exci_inhi[i]) entry of a layer becomes one Projection from a source layer to that layer:
+negative ids are resolved through the chunk's input table (local_layer_assigned_id -> from_node, from_layer),
+other ids name a layer of the same chunk by its "layer" field. Ids that resolve to nothing are skipped.
+
+Weights are stored as CSR with one row per source neuron, so a step only gathers the rows of the neurons that
+spiked: the cost is proportional to spikes * fan-out and independent of the total number of synapses.
+exci_inhi True -> excitatory (positive weights), False -> inhibitory (negative weights).
+
+Each projection carries an integer conduction delay in steps (>= 1): a spike emitted at step t is delivered into the
+input current of step t + delay. Connections inside a chunk get local_delay, connections between chunks get
+remote_delay, and the smallest inter-chunk delay is the window over which chunks can run without exchanging spikes.
+"""
+
+
+class Projection:
+    def __init__(self, source, target, indptr, indices, weights, excitatory=True, delay=1):
+        self.source = source  # (chunk index, layer index)
+        self.target = target
+        self.delay = delay
+        self.indptr = indptr  # int64, n_source + 1
+        self.indices = indices  # int32 target neuron of every synapse
+        self.weights = weights  # float64 signed weight of every synapse
+        self.excitatory = excitatory
+
+    @classmethod
+    def random(cls, source, target, n_source, n_target, fan_in, weight, excitatory, rng, delay=1):
+        # every target neuron receives fan_in synapses from uniformly drawn source neurons
+        fan_in = min(fan_in, n_source)
+        src = rng.integers(0, n_source, size=n_target * fan_in)
+        tgt = np.repeat(np.arange(n_target, dtype=np.int32), fan_in)
+        order = np.argsort(src, kind='stable')
+        indptr = np.zeros(n_source + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n_source), out=indptr[1:])
+        weights = rng.random(src.size) * (weight if excitatory else -weight)
+        return cls(source, target, indptr, tgt[order], weights[order], excitatory, delay)
+
+    @property
+    def n_synapses(self):
+        return self.indices.size
+
+    def propagate(self, spiking, out):  # adds the weight rows of the spiking source neurons into out (target current)
+        if spiking.size == 0:
+            return 0
+        starts = self.indptr[spiking]
+        counts = self.indptr[spiking + 1] - starts
+        if spiking.size == 1:
+            rows = slice(starts[0], starts[0] + counts[0])
+            np.add.at(out, self.indices[rows], self.weights[rows])
+            return counts[0]
+        total = counts.sum()
+        idx = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        idx += np.arange(total)
+        np.add.at(out, self.indices[idx], self.weights[idx])
+        return total
+
+
+def resolve_inputs(brain_data, topology=None):
+    # yields (source chunk index, source layer index, target chunk index, target layer index, ei); the input tables
+    # are read from the Topology arrays (built here when none is given)
+    if topology is None:
+        topology = Topology(brain_data)
+    chunks = brain_data['chunks']
+    layer_index = [{layer['layer']: j for j, layer in enumerate(chunk['layers'])} for chunk in chunks]
+    in_offsets = topology.in_offsets.tolist()
+    in_src, in_from_layer, in_local_id = (topology.in_src.tolist(), topology.in_from_layer.tolist(),
+                                          topology.in_local_id.tolist())
+    for ci, chunk in enumerate(chunks):
+        edges = range(in_offsets[ci], in_offsets[ci + 1])
+        external = {in_local_id[e]: (in_src[e], in_from_layer[e]) for e in edges}  # src -1: no such chunk
+        for lj, layer in enumerate(chunk['layers']):
+            for input_id, ei in zip(layer['input_layers'], layer['exci_inhi']):
+                if input_id < 0:
+                    if input_id not in external:
+                        continue
+                    src_ci, from_layer = external[input_id]
+                    if src_ci < 0:
+                        continue
+                else:
+                    src_ci, from_layer = ci, input_id
+                src_lj = layer_index[src_ci].get(from_layer)
+                if src_lj is None:
+                    continue
+                yield src_ci, src_lj, ci, lj, ei
+
+
+def compile_projections(brain_data, fan_in=32, w_exc=0.5, w_inh=1.0, local_delay=1, remote_delay=4, seed=None,
+                        targets=None, topology=None):  # targets: optional set of chunk indices, only their inputs
+    # are compiled; topology: the Topology of brain_data if the caller already has one
+    if local_delay < 1 or remote_delay < 1:
+        raise ValueError("delays must be at least one step")
+    inputs = list(resolve_inputs(brain_data, topology))
+    # one seed per projection so a subset (one worker's targets) is compiled exactly like the whole brain
+    seeds = (seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)).spawn(len(inputs))
+    chunks = brain_data['chunks']
+    projections = []
+    for (src_ci, src_lj, ci, lj, ei), proj_seed in zip(inputs, seeds):
+        if targets is not None and ci not in targets:
+            continue
+        n_source = chunks[src_ci]['layers'][src_lj]['size']
+        n_target = chunks[ci]['layers'][lj]['size']
+        projections.append(Projection.random((src_ci, src_lj), (ci, lj), n_source, n_target, fan_in,
+                                             w_exc if ei else w_inh, bool(ei), np.random.default_rng(proj_seed),
+                                             local_delay if src_ci == ci else remote_delay))
+    return projections
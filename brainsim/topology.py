@@ -0,0 +1,91 @@
+import itertools
+import numpy
+
+"""
+Integer-indexed runtime connectome
+
+One edge per entry of a chunk's input table (from_node, from_layer, local_layer_assigned_id), the same edges the
+networkx MultiDiGraph of WhiteMatter used to hold, but as flat NumPy arrays built in bulk from the genome:
+
+edges are grouped by target chunk (CSR):
+    in_offsets[ci]:in_offsets[ci + 1]   edges into chunk index ci
+    in_from_node     from_node (genome id) of every edge
+    in_src           source chunk index of every edge, -1 if from_node names no chunk
+    in_from_layer    layer id in the source chunk (the "layer" field)
+    in_local_id      local_layer_assigned_id the target chunk uses for this input
+and by source chunk:
+    out_offsets[ci]:out_offsets[ci + 1]  edges out of chunk index ci
+    out_dst          target chunk index of every edge
+    out_edge         position of the edge in the in_* arrays
+
+Chunks are referred to by their index in brain_data['chunks'], ids[] maps back to the genome 'id'.
+synapses.resolve_inputs reads the input tables from the in_* arrays (compile_projections and partition.chunk_graph
+go through it), the parallel workers find the chunks they export from the out_* arrays.
+networkx is only imported by to_networkx(), for plotting and analysis.
+"""
+
+
+class Topology:
+    def __init__(self, brain_data):
+        chunks = brain_data['chunks']
+        n = len(chunks)
+        self.n_chunks = n
+        self.ids = numpy.fromiter((chunk['id'] for chunk in chunks), dtype=numpy.int64, count=n)
+        self.index = dict(zip(self.ids.tolist(), range(n)))
+        counts = numpy.fromiter((len(chunk['input']['from_node']) for chunk in chunks), dtype=numpy.int64, count=n)
+        self.in_offsets = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=self.in_offsets[1:])
+        e = int(self.in_offsets[-1])
+        from_node = numpy.fromiter(itertools.chain.from_iterable(chunk['input']['from_node'] for chunk in chunks),
+                                   dtype=numpy.int64, count=e)
+        self.in_from_layer = numpy.fromiter(
+            itertools.chain.from_iterable(chunk['input']['from_layer'] for chunk in chunks), dtype=numpy.int64, count=e)
+        self.in_local_id = numpy.fromiter(
+            itertools.chain.from_iterable(chunk['input']['local_layer_assigned_id'] for chunk in chunks),
+            dtype=numpy.int64, count=e)
+        self.in_dst = numpy.repeat(numpy.arange(n, dtype=numpy.int64), counts)
+        self.in_from_node = from_node
+        self.in_src = self._chunk_index(from_node)
+        order = numpy.argsort(self.in_src, kind='stable')
+        valid = order[self.in_src[order] >= 0]
+        self.out_offsets = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(self.in_src[valid], minlength=n), out=self.out_offsets[1:])
+        self.out_edge = valid
+        self.out_dst = self.in_dst[valid]
+        self._graph = None
+
+    def _chunk_index(self, chunk_ids):  # genome ids -> chunk index, -1 for unknown ids
+        if numpy.array_equal(self.ids, numpy.arange(self.n_chunks)):  # the usual case, id == position
+            return numpy.where((chunk_ids >= 0) & (chunk_ids < self.n_chunks), chunk_ids, -1)
+        if self.n_chunks == 0:
+            return numpy.full(chunk_ids.shape, -1, dtype=numpy.int64)
+        order = numpy.argsort(self.ids, kind='stable')
+        found = order[numpy.minimum(numpy.searchsorted(self.ids, chunk_ids, sorter=order), self.n_chunks - 1)]
+        return numpy.where(self.ids[found] == chunk_ids, found, -1)
+
+    @property
+    def n_edges(self):
+        return self.in_src.size
+
+    def predecessors(self, ci):
+        return self.in_src[self.in_offsets[ci]:self.in_offsets[ci + 1]]
+
+    def successors(self, ci):
+        return self.out_dst[self.out_offsets[ci]:self.out_offsets[ci + 1]]
+
+    def in_degree(self):
+        return numpy.diff(self.in_offsets)
+
+    def out_degree(self):
+        return numpy.diff(self.out_offsets)
+
+    def to_networkx(self):  # MultiDiGraph keyed by genome ids, built once on first use
+        if self._graph is None:
+            import networkx as nx
+            graph = nx.MultiDiGraph()
+            graph.add_nodes_from(self.ids.tolist())
+            graph.add_edges_from(zip(self.in_from_node.tolist(), self.ids[self.in_dst].tolist(),
+                                     [{'from_layer': fl, 'local_id': li} for fl, li in
+                                      zip(self.in_from_layer.tolist(), self.in_local_id.tolist())]))
+            self._graph = graph
+        return self._graph
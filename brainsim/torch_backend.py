@@ -0,0 +1,125 @@
+import time
+import numpy as np
+import torch
+
+"""
+CPU PyTorch backend: the population step compiled with torch.compile (inductor), the synaptic scatter on ATen
+
+The state stays in the NumPy arrays of the populations and the delay ring buffers. torch.from_numpy wraps them
+without a copy and the compiled step writes its results back into them, so Layer views, GreyMatter.spiking and
+everything else that reads the arrays work unchanged. The step functions take the arguments of the Numba kernels
+(brainsim.kernels), populations with backend="torch" call them in place of the NumPy step.
+
+Inductor fuses the V update, the u update, the threshold test and the resets into one vectorised C++ loop and
+compiles it once for all population sizes (dynamic=True); the first call pays the compilation, several seconds.
+propagate() is Projection.propagate with the row gather and the scatter (index_add_ in place of np.add.at) done by
+multithreaded ATen ops, its sizes change with every step and it is not compiled. Sums are accumulated in another
+order than NumPy, results agree within float64 rounding.
+"""
+
+
+def _izhikevich(V, u, I_ext, dt, Vr, Vt, k, C, I, a, b, Vpeak, c, d, V_out, u_out, spike):
+    v = V + dt * (((V - Vr) * k * (V - Vt) - u + I + I_ext) / C)
+    w = u + dt * (((v - Vr) * b - u) * a)
+    fired = v > Vpeak
+    u_out.copy_(w)
+    V_out.copy_(torch.where(fired, Vpeak, v))
+    V.copy_(torch.where(fired, c, v))
+    u.copy_(torch.where(fired, w + d, w))
+    spike.copy_(fired)
+
+
+def _izhikevich2003_population(V, u, I_ext, dt, I, a, b, c, d, Vpeak, V_out, u_out, spike):
+    v = V + (V * V * 0.04 + V * 5 + 140 - u.sum(0) + I + I_ext) * dt
+    w = u + (b * v - u) * a * dt
+    fired = v > Vpeak
+    u_out.copy_(w)
+    V_out.copy_(torch.where(fired, Vpeak, v))
+    V.copy_(torch.where(fired, c, v))
+    u.copy_(torch.where(fired, w + d, w))
+    spike.copy_(fired)
+
+
+_compiled = {}
+
+
+def _step(fn, dt, arrays):
+    if fn not in _compiled:
+        _compiled[fn] = torch.compile(fn, dynamic=True)
+    tensors = [torch.from_numpy(x) for x in arrays]
+    _compiled[fn](*tensors[:3], dt, *tensors[3:])
+
+
+def izhikevich(V, u, I_ext, dt, Vr, Vt, k, C, I, a, b, Vpeak, c, d, V_out, u_out, spike):
+    _step(_izhikevich, dt, (V, u, _input(I_ext, V), Vr, Vt, k, C, I, a, b, Vpeak, c, d, V_out, u_out, spike))
+
+
+def izhikevich2003_population(V, u, I_ext, dt, I, a, b, c, d, Vpeak, V_out, u_out, spike):
+    _step(_izhikevich2003_population, dt, (V, u, _input(I_ext, V), I, a, b, c, d, Vpeak, V_out, u_out, spike))
+
+
+def _input(I_ext, V):  # the kernels pass a length 0 array for no external input
+    return np.zeros_like(V) if I_ext.size == 0 else I_ext
+
+
+def propagate(proj, spiking, out):  # Projection.propagate on torch tensors, adds into out in place
+    if spiking.size == 0:
+        return 0
+    indptr = torch.from_numpy(proj.indptr)
+    spiking = torch.from_numpy(spiking)
+    starts = indptr.index_select(0, spiking)
+    counts = indptr.index_select(0, spiking + 1) - starts
+    total = int(counts.sum())
+    idx = torch.repeat_interleave(starts - torch.cumsum(counts, 0) + counts, counts)
+    idx += torch.arange(total)
+    # index_select, the advanced indexing of tensor[idx] is several times slower
+    torch.from_numpy(out).index_add_(0, torch.from_numpy(proj.indices).index_select(0, idx),
+                                     torch.from_numpy(proj.weights).index_select(0, idx))
+    return total
+
+
+def benchmark(brain_data, steps=50, compare=20):
+    # {backend: (steps/second, seconds of the first step)} of WhiteMatter.step_all, and the largest V difference
+    # between the backends after compare steps from the same seed
+    from .grey_white_matter import WhiteMatter
+    results = {}
+    brains = {}
+    for backend in ("numpy", "torch"):
+        brain = WhiteMatter(brain_data, seed=0, backend=backend)
+        start = time.perf_counter()
+        brain.step_all()  # compiles the torch step
+        first = time.perf_counter() - start
+        for _ in range(compare - 1):
+            brain.step_all()
+        brains[backend] = brain
+        start = time.perf_counter()
+        for _ in range(steps):
+            brain.step_all()
+        results[backend] = (steps / (time.perf_counter() - start), first)
+    check = {backend: WhiteMatter(brain_data, seed=1, backend=backend) for backend in brains}
+    for _ in range(compare):
+        for brain in check.values():
+            brain.step_all()
+    diff = max(np.abs(g1.population.V - g2.population.V).max() for g1, g2 in
+               zip(check["numpy"].grey_matter, check["torch"].grey_matter))
+    return results, diff
+
+
+if __name__ == "__main__":
+    import json
+    from .grey_white_matter import scale_brain
+    with open("brain-data.json") as bf:
+        sample = json.load(bf)
+    from .populations import throughput
+    print("torch", torch.__version__, "threads", torch.get_num_threads())
+    for n in (10 ** 4, 10 ** 6, 10 ** 7):
+        steps = max(5, 10 ** 7 // n)
+        print(f"IzhikevichPopulation n={n:<9} " + "  ".join(f"{backend} {throughput(n, steps, 70, backend):.3e}"
+                                                           for backend in ("numpy", "torch")) + " neuron-steps/s")
+    for label, data, steps in (("sample brain", sample, 2000),
+                               ("100x layer size", scale_brain(sample, size_factor=100), 200),
+                               ("1000x layer size", scale_brain(sample, size_factor=1000), 50)):
+        results, diff = benchmark(data, steps)
+        print(f"{label:>17}: " + "  ".join(f"{backend} {rate:8.1f} steps/s (first step {first:.2f} s)"
+                                            for backend, (rate, first) in results.items()) +
+              f"  max |dV| {diff:.2e}")
@@ -1,379 +1,292 @@
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.widgets import Button, Slider
-from matplotlib import animation
+from brainsim.izhikevich import Sim, Vnullcline, unullcline, field
+from brainsim.render import BlitRenderer, RingBuffer
+from brainsim.producer import Producer
+from brainsim.phase_plane import PhasePlane
 
 """
-5.2.4  dns https://www.izhikevich.org/publications/
-
-Model:
-dV/dt  = (k*(V - Vr)*(V - Vt) - u + I)/C
-du/dt = a*(b*(V - Vr) - u)
-
-if v ≥ 1, then
-v <- c, u <- u + d
-
-V approximation of membrane potential
-u recovery variable slow outward currents
-I injected current
-a, b recovery dynamics
-c reset v value
-d update recovery value u
-
-for multiple recovery variables: 
-a b d and w become vectors
-dV/dt = I + v^2 - sum(u)
-
-Nullclides:
-u = k*(V - Vr)*(V - Vt) + I
-u = b*(V - Vr) 
+Interactive phase plane of the Izhikevich 2007 model, brainsim.izhikevich
 """
 
 
-class Sim:
-    def __init__(self, Vr, Vt, Vpeak, a, b, c, d, k, I, C):
-        self.Vsim = 0
-        self.usim = 0
-        self.Vr = Vr
-        self.Vt = Vt
-        self.Vpeak = Vpeak
-        self.a = a
-        self.b = b
-        self.c = c
-        self.d = d
-        self.k = k
-        self.I = I
-        self.C = C
-
-    def updatevar(self, Vr, Vt, Vpeak, a, b, c, d, k, I, C):
-        self.Vr = Vr
-        self.Vt = Vt
-        self.Vpeak = Vpeak
-        self.a = a
-        self.b = b
-        self.c = c
-        self.d = d
-        self.k = k
-        self.I = I
-        self.C = C
-
-    def step(self):
-        spike = 0
-        self.Vsim = self.Vsim + (self.k * (self.Vsim - self.Vr) * (self.Vsim - self.Vt) - self.usim + self.I) / self.C
-        self.usim = self.usim + self.a * (self.b * (self.Vsim - self.Vr) - self.usim)
-        if self.Vsim > self.Vpeak:
-            spike = 1
-            upad = self.usim
-            self.Vsim = self.c
-            self.usim = self.usim + self.d
-            return self.Vpeak, upad, spike  # padding for consistent spikes
-        else:
-            return self.Vsim, self.usim, spike
-
-
-def frames():
-    while True:
-        yield s.step()
-
-
-def Vnullcline(V, Vr, Vt, k, I):
-    return k * (V - Vr) * (V - Vt) + I
-
-
-def unullcline(V, Vr, b):
-    return b * (V - Vr)
-
-
-def U_vec(X, Y, Vt, Vr, k, C, I):
-    return (np.full(X.shape, k) * (X - np.full(X.shape, Vr)) * (X - np.full(X.shape, Vt)) - Y + np.full(X.shape, I)) / np.full(X.shape, C)
-
-
-def V_vec(X, Y, a, b, Vr):
-    return np.full(X.shape, a)*(np.full(X.shape, b)*(X - np.full(X.shape, Vr)) - Y)
-
-
-def normalize(U, V):
-    U / (U * U + V * V)
-    return U / (U * U + V * V) ** 0.5, V / (U * U + V * V) ** 0.5
-
-
-v = np.linspace(-500, 500, 2000)
-
-# Define initial parameters
-Vr = -60
-Vt = -40
-Vpeak = 35
-a = 0.03
-b = -2
-c = -50
-d = 100
-k = 0.7
-I = 0.0
-C = 100
-s = Sim(Vr, Vt, Vpeak, a, b, c, d, k, I, C)
-x1 = [0] * 100
-y1 = [0] * 100
-x2 = np.arange(-1000, 0, 1)
-y2 = [0] * x2.size
-i = [-1.5] * x2.size
-x = np.arange(-200, 120, 12)
-y = np.arange(-500, 1000, 150)
-X, Y = np.meshgrid(x, y)
-
-# Create the figure and the line that we will manipulate
-fig, ((ax1, ax2), axs) = plt.subplots(2, 2, figsize=(15, 10))
-gs = axs[1].get_gridspec()
-for ax in axs[:]:
-    ax.remove()
-ax3 = fig.add_subplot(gs[1, :])
-ax1.plot(v, Vnullcline(v, Vr, Vt, k, I), lw=2)
-ax1.plot(v, unullcline(v, Vr, b), lw=2)
-ax1.set_xlabel('V')
-ax1.set_ylabel('u')
-U, V = U_vec(X, Y, Vt, Vr, k, C, I), V_vec(X, Y, a, b, Vr)
-U, V = normalize(U, V)
-ax1.quiver(X, Y, U, V)
-# setting limits to the axes
-ax1.set_ylim((-500, 1000))
-ax1.set_xlim((-200, Vpeak * 1.2))
-ax2.set_ylim((-500, 1000))
-ax2.set_xlim((-200, Vpeak * 1.2))
-
-# adjust the main plot to make room for the sliders
-fig.subplots_adjust(left=0.35, bottom=0.35)
-
-# Make a vertically oriented slider to control a
-axa = fig.add_axes([0.05, 0.35, 0.03, 0.5])
-a_slider = Slider(
-    ax=axa,
-    label="a",
-    valmin=0,
-    valmax=0.2,
-    valinit=a,
-    orientation="vertical"
-)
-
-# Make a vertically oriented slider to control b
-axb = fig.add_axes([0.1, 0.35, 0.03, 0.5])
-b_slider = Slider(
-    ax=axb,
-    label="b",
-    valmin=-10,
-    valmax=40,
-    valinit=b,
-    orientation="vertical"
-)
-
-# Make a vertically oriented slider to control k
-axk = fig.add_axes([0.15, 0.35, 0.03, 0.5])
-k_slider = Slider(
-    ax=axk,
-    label="k",
-    valmin=0,
-    valmax=2,
-    valinit=k,
-    orientation="vertical"
-)
-
-# Make a vertically oriented slider to control C
-axC = fig.add_axes([0.2, 0.35, 0.03, 0.5])
-C_slider = Slider(
-    ax=axC,
-    label="C",
-    valmin=1,
-    valmax=200,
-    valinit=C,
-    orientation="vertical"
-)
-# Make a horizontal slider to control the current.
-axI = fig.add_axes([0.5, 0.1, 0.35, 0.03])
-I_slider = Slider(
-    ax=axI,
-    label='I',
-    valmin=-1000,
-    valmax=1000,
-    valinit=I,
-)
-
-# Make a horizontal slider to control c.
-axc = fig.add_axes([0.5, 0.2, 0.35, 0.03])
-c_slider = Slider(
-    ax=axc,
-    label='c',
-    valmin=-100,
-    valmax=100,
-    valinit=c,
-)
-
-# Make a horizontal slider to control d.
-axd = fig.add_axes([0.5, 0.15, 0.35, 0.03])
-d_slider = Slider(
-    ax=axd,
-    label='d',
-    valmin=-100,
-    valmax=200,
-    valinit=d,
-)
-
-# Make a horizontal slider to control Vr.
-axVr = fig.add_axes([0.05, 0.1, 0.35, 0.03])
-Vr_slider = Slider(
-    ax=axVr,
-    label='Vr',
-    valmin=-100,
-    valmax=0,
-    valinit=Vr,
-)
-
-# Make a horizontal slider to control Vt.
-axVt = fig.add_axes([0.05, 0.15, 0.35, 0.03])
-Vt_slider = Slider(
-    ax=axVt,
-    label='Vt',
-    valmin=-100,
-    valmax=0,
-    valinit=Vt,
-)
-
-# Make a horizontal slider to control Vpeak.
-axVpeak = fig.add_axes([0.05, 0.2, 0.35, 0.03])
-Vpeak_slider = Slider(
-    ax=axVpeak,
-    label='Vpeak',
-    valmin=-100,
-    valmax=100,
-    valinit=Vpeak,
-)
-
-
-# The function to be called anytime a slider's value changes
-def update(val):
-    ax1.clear()
-    ax1.plot(v, Vnullcline(v, Vr_slider.val, Vt_slider.val, k_slider.val, I_slider.val), lw=2)
-    ax1.plot(v, unullcline(v, Vr_slider.val, b_slider.val), lw=2)
-    U, V = U_vec(X, Y, Vt_slider.val, Vr_slider.val, k_slider.val, C_slider.val, I_slider.val), V_vec(X, Y, a_slider.val, b_slider.val, Vr_slider.val)
-    U, V = normalize(U, V)
-    ax1.quiver(X, Y, U, V)
-    ax2.clear()
-    ax2.plot(v, Vnullcline(v, Vr_slider.val, Vt_slider.val, k_slider.val, I_slider.val), lw=2)
-    ax2.plot(v, unullcline(v, Vr_slider.val, b_slider.val), lw=2)
-    fig.canvas.draw_idle()
-    s.updatevar(Vr_slider.val, Vt_slider.val, Vpeak_slider.val, a_slider.val, b_slider.val, c_slider.val, d_slider.val,
-                k_slider.val, I_slider.val, C_slider.val)
-
-
-# register the update function with each slider
-Vr_slider.on_changed(update)
-Vt_slider.on_changed(update)
-Vpeak_slider.on_changed(update)
-a_slider.on_changed(update)
-b_slider.on_changed(update)
-c_slider.on_changed(update)
-d_slider.on_changed(update)
-k_slider.on_changed(update)
-I_slider.on_changed(update)
-C_slider.on_changed(update)
-
-# Create a `matplotlib.widgets.Button` to reset the sliders to initial values.
-rs_ib = fig.add_axes([0.1, 0.025, 0.1, 0.04])
-button_ib = Button(rs_ib, 'Intrinsically bursting', hovercolor='0.975')
-rs_ax = fig.add_axes([0.25, 0.025, 0.1, 0.04])
-button_rs = Button(rs_ax, 'Regular spiking', hovercolor='0.975')
-rs_ch = fig.add_axes([0.4, 0.025, 0.1, 0.04])
-button_ch = Button(rs_ch, 'chattering', hovercolor='0.975')
-rs_res = fig.add_axes([0.55, 0.025, 0.1, 0.04])
-button_res = Button(rs_res, 'resonator', hovercolor='0.975')
-
-def regular_spiking(event):
-    Vr_slider.reset()
-    Vt_slider.reset()
-    Vpeak_slider.reset()
-    a_slider.reset()
-    b_slider.reset()
-    c_slider.reset()
-    d_slider.reset()
-    k_slider.reset()
-    C_slider.reset()
-
-
-def intrinsically_bursting(event):
-    Vr_slider.set_val(-75)
-    Vt_slider.set_val(-45)
-    Vpeak_slider.set_val(50)
-    a_slider.set_val(0.01)
-    b_slider.set_val(5)
-    c_slider.set_val(-56)
-    d_slider.set_val(130)
-    k_slider.set_val(1.2)
-    C_slider.set_val(150)
-
-
-def chattering(event):
-    Vr_slider.set_val(-60)
-    Vt_slider.set_val(-40)
-    Vpeak_slider.set_val(25)
-    a_slider.set_val(0.03)
-    b_slider.set_val(5)
-    c_slider.set_val(-40)
-    d_slider.set_val(150)
-    k_slider.set_val(1.5)
-    C_slider.set_val(50)
-
-def resonator(event):
-    Vr_slider.set_val(-60)
-    Vt_slider.set_val(-60)
-    Vpeak_slider.set_val(35)
-    a_slider.set_val(0.03)
-    b_slider.set_val(30)
-    c_slider.set_val(-50)
-    d_slider.set_val(100)
-    k_slider.set_val(0.7)
-    C_slider.set_val(140)
-
-"""
-TODO?
-needs custom code:
-low threshold spiking 
-fast spiking 
-late_spiking 
-thalamocortical
-reticular thalamic nucleus
-ecc
-"""
-
-
-def animate(args):
-    ax2.clear()
-    ax3.clear()
+def main():
+    v = np.linspace(-500, 500, 2000)
+
+    # Define initial parameters
+    Vr = -60
+    Vt = -40
+    Vpeak = 35
+    a = 0.03
+    b = -2
+    c = -50
+    d = 100
+    k = 0.7
+    I = 0.0
+    C = 100
+    s = Sim(Vr, Vt, Vpeak, a, b, c, d, k, I, C)
+    producer = Producer(s)  # steps s in the background, update() goes through producer.updatevar
+
+    x2 = np.arange(-1000, 0, 1)
+    x1, y1 = RingBuffer(100), RingBuffer(100)  # phase plane trajectory
+    y2, i = RingBuffer(x2.size), RingBuffer(x2.size, fill=-1.5)  # V and I traces
+    x = np.arange(-200, 120, 12)
+    y = np.arange(-500, 1000, 150)
+    X, Y = np.meshgrid(x, y)
+
+    # Create the figure and the line that we will manipulate
+    fig, ((ax1, ax2), axs) = plt.subplots(2, 2, figsize=(15, 10))
+    gs = axs[1].get_gridspec()
+    for ax in axs[:]:
+        ax.remove()
+    ax3 = fig.add_subplot(gs[1, :])
+    ax1.set_xlabel('V')
+    ax1.set_ylabel('u')
+
+    def compute(U, V):  # field and nullclines for the current slider values
+        field(X, Y, U, V, Vr_slider.val, Vt_slider.val, k_slider.val, C_slider.val, I_slider.val, a_slider.val,
+              b_slider.val)
+        return (Vnullcline(v, Vr_slider.val, Vt_slider.val, k_slider.val, I_slider.val),
+                unullcline(v, Vr_slider.val, b_slider.val))
+
+    phase = PhasePlane(ax1, X, Y, v, compute, normalize=True, mirror=ax2)
+    # setting limits to the axes
     ax1.set_ylim((-500, 1000))
-    ax1.set_xlim((-200, Vpeak_slider.val * 1.2))
+    ax1.set_xlim((-200, Vpeak * 1.2))
     ax2.set_ylim((-500, 1000))
-    ax2.set_xlim((-200, Vpeak_slider.val * 1.2))
+    ax2.set_xlim((-200, Vpeak * 1.2))
+    ax3.set_xlim((x2[0], x2[-1]))
+    ax3.set_ylim((-110, 110))
+
+    # adjust the main plot to make room for the sliders
+    fig.subplots_adjust(left=0.35, bottom=0.35)
+
+    # Make a vertically oriented slider to control a
+    axa = fig.add_axes([0.05, 0.35, 0.03, 0.5])
+    a_slider = Slider(
+        ax=axa,
+        label="a",
+        valmin=0,
+        valmax=0.2,
+        valinit=a,
+        orientation="vertical"
+    )
+
+    # Make a vertically oriented slider to control b
+    axb = fig.add_axes([0.1, 0.35, 0.03, 0.5])
+    b_slider = Slider(
+        ax=axb,
+        label="b",
+        valmin=-10,
+        valmax=40,
+        valinit=b,
+        orientation="vertical"
+    )
+
+    # Make a vertically oriented slider to control k
+    axk = fig.add_axes([0.15, 0.35, 0.03, 0.5])
+    k_slider = Slider(
+        ax=axk,
+        label="k",
+        valmin=0,
+        valmax=2,
+        valinit=k,
+        orientation="vertical"
+    )
+
+    # Make a vertically oriented slider to control C
+    axC = fig.add_axes([0.2, 0.35, 0.03, 0.5])
+    C_slider = Slider(
+        ax=axC,
+        label="C",
+        valmin=1,
+        valmax=200,
+        valinit=C,
+        orientation="vertical"
+    )
+    # Make a horizontal slider to control the current.
+    axI = fig.add_axes([0.5, 0.1, 0.35, 0.03])
+    I_slider = Slider(
+        ax=axI,
+        label='I',
+        valmin=-1000,
+        valmax=1000,
+        valinit=I,
+    )
+
+    # Make a horizontal slider to control c.
+    axc = fig.add_axes([0.5, 0.2, 0.35, 0.03])
+    c_slider = Slider(
+        ax=axc,
+        label='c',
+        valmin=-100,
+        valmax=100,
+        valinit=c,
+    )
+
+    # Make a horizontal slider to control d.
+    axd = fig.add_axes([0.5, 0.15, 0.35, 0.03])
+    d_slider = Slider(
+        ax=axd,
+        label='d',
+        valmin=-100,
+        valmax=200,
+        valinit=d,
+    )
+
+    # Make a horizontal slider to control Vr.
+    axVr = fig.add_axes([0.05, 0.1, 0.35, 0.03])
+    Vr_slider = Slider(
+        ax=axVr,
+        label='Vr',
+        valmin=-100,
+        valmax=0,
+        valinit=Vr,
+    )
+
+    # Make a horizontal slider to control Vt.
+    axVt = fig.add_axes([0.05, 0.15, 0.35, 0.03])
+    Vt_slider = Slider(
+        ax=axVt,
+        label='Vt',
+        valmin=-100,
+        valmax=0,
+        valinit=Vt,
+    )
+
+    # Make a horizontal slider to control Vpeak.
+    axVpeak = fig.add_axes([0.05, 0.2, 0.35, 0.03])
+    Vpeak_slider = Slider(
+        ax=axVpeak,
+        label='Vpeak',
+        valmin=-100,
+        valmax=100,
+        valinit=Vpeak,
+    )
+
+    # The function to be called anytime a slider's value changes
+    def update(val):
+        phase.request()
+        ax1.set_xlim((-200, Vpeak_slider.val * 1.2))
+        ax2.set_xlim((-200, Vpeak_slider.val * 1.2))
+        producer.updatevar(Vr_slider.val, Vt_slider.val, Vpeak_slider.val, a_slider.val, b_slider.val, c_slider.val,
+                           d_slider.val, k_slider.val, I_slider.val, C_slider.val)
+
+    # register the update function with each slider
+    Vr_slider.on_changed(update)
+    Vt_slider.on_changed(update)
+    Vpeak_slider.on_changed(update)
+    a_slider.on_changed(update)
+    b_slider.on_changed(update)
+    c_slider.on_changed(update)
+    d_slider.on_changed(update)
+    k_slider.on_changed(update)
+    I_slider.on_changed(update)
+    C_slider.on_changed(update)
+    phase.flush()
+
+    # Create a `matplotlib.widgets.Button` to reset the sliders to initial values.
+    rs_ib = fig.add_axes([0.1, 0.025, 0.1, 0.04])
+    button_ib = Button(rs_ib, 'Intrinsically bursting', hovercolor='0.975')
+    rs_ax = fig.add_axes([0.25, 0.025, 0.1, 0.04])
+    button_rs = Button(rs_ax, 'Regular spiking', hovercolor='0.975')
+    rs_ch = fig.add_axes([0.4, 0.025, 0.1, 0.04])
+    button_ch = Button(rs_ch, 'chattering', hovercolor='0.975')
+    rs_res = fig.add_axes([0.55, 0.025, 0.1, 0.04])
+    button_res = Button(rs_res, 'resonator', hovercolor='0.975')
+
+    def regular_spiking(event):
+        Vr_slider.reset()
+        Vt_slider.reset()
+        Vpeak_slider.reset()
+        a_slider.reset()
+        b_slider.reset()
+        c_slider.reset()
+        d_slider.reset()
+        k_slider.reset()
+        C_slider.reset()
+
+    def intrinsically_bursting(event):
+        Vr_slider.set_val(-75)
+        Vt_slider.set_val(-45)
+        Vpeak_slider.set_val(50)
+        a_slider.set_val(0.01)
+        b_slider.set_val(5)
+        c_slider.set_val(-56)
+        d_slider.set_val(130)
+        k_slider.set_val(1.2)
+        C_slider.set_val(150)
+
+    def chattering(event):
+        Vr_slider.set_val(-60)
+        Vt_slider.set_val(-40)
+        Vpeak_slider.set_val(25)
+        a_slider.set_val(0.03)
+        b_slider.set_val(5)
+        c_slider.set_val(-40)
+        d_slider.set_val(150)
+        k_slider.set_val(1.5)
+        C_slider.set_val(50)
+
+    def resonator(event):
+        Vr_slider.set_val(-60)
+        Vt_slider.set_val(-60)
+        Vpeak_slider.set_val(35)
+        a_slider.set_val(0.03)
+        b_slider.set_val(30)
+        c_slider.set_val(-50)
+        d_slider.set_val(100)
+        k_slider.set_val(0.7)
+        C_slider.set_val(140)
+
+    """
+    TODO?
+    needs custom code:
+    low threshold spiking 
+    fast spiking 
+    late_spiking 
+    thalamocortical
+    reticular thalamic nucleus
+    ecc
     """
-    ax2.set_xlim((-Vpeak_slider.val*2, Vpeak_slider.val))
-    ax2.set_ylim((-75, 100))
-    ax3.set_ylim((-Vpeak_slider.val, Vpeak_slider.val))"""
-    x1.pop(0)
-    y1.pop(0)
-    y2.pop(0)
-    i.pop(0)
-    x1.append(args[0])
-    y1.append(args[1])
-    y2.append(args[0])
-    i.append(I_slider.val / 10)
-    return ax2.plot(x1, y1, color='g'), ax3.plot(x2, y2, color='b'), ax3.plot(x2, i, color='r'), ax2.plot(v,
-                                                                                                          Vnullcline(v,
-                                                                                                                     Vr_slider.val,
-                                                                                                                     Vt_slider.val,
-                                                                                                                     k_slider.val,
-                                                                                                                     I_slider.val),
-                                                                                                          lw=2), ax2.plot(
-        v, unullcline(v, Vr_slider.val, b_slider.val), lw=2), plt.show()
-
-
-button_rs.on_clicked(regular_spiking)
-button_ib.on_clicked(intrinsically_bursting)
-button_ch.on_clicked(chattering)
-button_res.on_clicked(resonator)
-anim = animation.FuncAnimation(fig, animate, frames=frames, interval=30, save_count=2000)
-plt.show()
+
+    def produce():
+        V, u = producer.drain()
+        x1.push(V)
+        y1.push(u)
+        y2.push(V)
+        i.push(np.full(V.size, I_slider.val / 10))
+
+    button_rs.on_clicked(regular_spiking)
+    button_ib.on_clicked(intrinsically_bursting)
+    button_ch.on_clicked(chattering)
+    button_res.on_clicked(resonator)
+
+    # Make a horizontal slider to control the simulation speed, 10^speed times one step per 30 ms.
+    axspeed = fig.add_axes([0.75, 0.03, 0.15, 0.03])
+    speed_slider = Slider(
+        ax=axspeed,
+        label='speed',
+        valmin=0,
+        valmax=4,
+        valinit=0,
+    )
+
+    def set_speed(val):
+        producer.speed = 10 ** val
+
+    speed_slider.on_changed(set_speed)
+
+    renderer = BlitRenderer(fig)
+    renderer.add_line(ax2, x1, y1, color='g')
+    renderer.add_line(ax3, x2, y2, color='b')
+    renderer.add_line(ax3, x2, i, color='r')
+    fig.canvas.mpl_connect('close_event', lambda event: producer.stop())
+    producer.start()
+    renderer.start(produce)
+    plt.show()
+
+
+if __name__ == "__main__":
+    main()